@@ -0,0 +1,191 @@
+"""Ranked title suggestions for /autocomplete, built once at load time"""
+import re
+from bisect import bisect_left
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+from title_index import substring_trigrams
+
+MAX_LIMIT = 50  # Largest `limit` /autocomplete accepts
+PRECOMPUTED_PREFIX_LEN = 3  # Prefixes up to this length are answered from a table
+FUZZY_THRESHOLD = 60  # Minimum token_sort_ratio for a fuzzy suggestion
+
+# Match quality tiers, best first
+TITLE_PREFIX, WORD_PREFIX, SUBSTRING = 0, 1, 2
+
+_WORD_START_RE = re.compile(r'(?<![a-z0-9])[a-z0-9]')
+
+
+class AutocompleteIndex:
+    """Suggests titles for a partial query, ranked by match quality then popularity.
+
+    Title-prefix and word-prefix matches come from a sorted array of every
+    word-start suffix of every title ("the dark knight", "dark knight",
+    "knight"), searched with bisect. Short prefixes, which would match a large
+    slice of that array, are precomputed. Mid-word substrings come from a
+    trigram inverted index whose postings are stored in popularity order, so
+    scanning stops as soon as enough matches are found. Fuzzy matches from
+    the title index fill whatever is left.
+    """
+
+    def __init__(self, title_index, vote_counts):
+        self.title_index = title_index
+        self.titles = title_index.titles
+        self.lower = title_index.lower
+        n = len(self.titles)
+
+        # Popularity rank: most votes first, then alphabetical
+        votes = np.asarray(vote_counts, dtype=np.int64)
+        self.rank_to_row = np.array(
+            sorted(range(n), key=lambda r: (-votes[r], self.lower[r], r)), dtype=np.int32
+        )
+        self.row_to_rank = np.empty(n, dtype=np.int32)
+        self.row_to_rank[self.rank_to_row] = np.arange(n, dtype=np.int32)
+
+        entries = []
+        for row, title in enumerate(self.lower):
+            for m in _WORD_START_RE.finditer(title):
+                pos = m.start()
+                entries.append((title[pos:], row, TITLE_PREFIX if pos == 0 else WORD_PREFIX))
+        entries.sort()
+        self.prefix_keys = [e[0] for e in entries]
+        self.prefix_rows = np.array([e[1] for e in entries], dtype=np.int32)
+        self.prefix_tiers = np.array([e[2] for e in entries], dtype=np.int64)
+
+        self.short_prefixes = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LEN + 1):
+            for prefix in {key[:length] for key in self.prefix_keys if len(key) >= length}:
+                self.short_prefixes[prefix] = self._rank_prefix_range(prefix, MAX_LIMIT)
+
+        ranks_by_gram = {}
+        for row, title in enumerate(self.titles):
+            rank = int(self.row_to_rank[row])
+            for gram in substring_trigrams(title):
+                ranks_by_gram.setdefault(gram, []).append(rank)
+        self.gram_ranks = {g: np.sort(np.array(r, dtype=np.int32)) for g, r in ranks_by_gram.items()}
+
+    @classmethod
+    def from_arrays(cls, title_index, arrays):
+        """An index saved with to_arrays, e.g. read back from the model artifact"""
+        index = cls.__new__(cls)
+        index.title_index = title_index
+        index.titles = title_index.titles
+        index.lower = title_index.lower
+        index.rank_to_row = arrays["rank_to_row"]
+        index.row_to_rank = np.empty(len(index.rank_to_row), dtype=np.int32)
+        index.row_to_rank[index.rank_to_row] = np.arange(len(index.rank_to_row), dtype=np.int32)
+        index.prefix_keys = arrays["prefix_keys"]
+        index.prefix_rows = arrays["prefix_rows"]
+        index.prefix_tiers = arrays["prefix_tiers"]
+        index.short_prefixes = _unflatten(arrays["short_prefix_keys"], arrays["short_prefix_offsets"],
+                                          arrays["short_prefix_rows"])
+        index.gram_ranks = _unflatten(arrays["gram_keys"], arrays["gram_offsets"], arrays["gram_rank_lists"])
+        return index
+
+    def to_arrays(self):
+        """The index as flat arrays and key lists, the form from_arrays reads back"""
+        short_keys, short_offsets, short_rows = _flatten(self.short_prefixes)
+        gram_keys, gram_offsets, gram_ranks = _flatten(self.gram_ranks)
+        return {"rank_to_row": self.rank_to_row, "prefix_keys": self.prefix_keys,
+                "prefix_rows": self.prefix_rows, "prefix_tiers": self.prefix_tiers,
+                "short_prefix_keys": short_keys, "short_prefix_offsets": short_offsets,
+                "short_prefix_rows": short_rows,
+                "gram_keys": gram_keys, "gram_offsets": gram_offsets, "gram_rank_lists": gram_ranks}
+
+    def _rank_prefix_range(self, prefix, limit):
+        lo = bisect_left(self.prefix_keys, prefix)
+        hi = bisect_left(self.prefix_keys, prefix + '\U0010ffff')
+        if lo == hi:
+            return np.empty(0, dtype=np.int32)
+        rows = self.prefix_rows[lo:hi]
+        n = len(self.titles)
+        order = np.sort(self.prefix_tiers[lo:hi] * n + self.row_to_rank[rows])
+        ranks = order % n
+        # A title can match at several word starts; keep its best tier only
+        _, first = np.unique(ranks, return_index=True)
+        return self.rank_to_row[ranks[np.sort(first)][:limit]]
+
+    def _substring_rows(self, query_lower, exclude, limit):
+        grams = substring_trigrams(query_lower)
+        if any(g not in self.gram_ranks for g in grams):
+            return []
+        if grams:
+            lists = sorted((self.gram_ranks[g] for g in grams), key=len)
+            ranks = lists[0]
+            for other in lists[1:]:
+                ranks = np.intersect1d(ranks, other, assume_unique=True)
+            ranks = ranks.tolist()
+        else:
+            ranks = range(len(self.rank_to_row))  # No trigram in the query: scan every title
+        found = []
+        for rank in ranks:
+            row = int(self.rank_to_row[rank])
+            if row not in exclude and query_lower in self.lower[row]:
+                found.append(row)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def _fuzzy_rows(self, query, exclude, limit):
+        scored = []
+        for row in self.title_index.candidates(query).tolist():
+            if row in exclude:
+                continue
+            score = fuzz.token_sort_ratio(query, self.titles[row])
+            if score >= FUZZY_THRESHOLD:
+                scored.append((-score, int(self.row_to_rank[row]), row))
+        scored.sort()
+        return [row for _, _, row in scored[:limit]]
+
+    def indexed_rows(self, query, limit=10):
+        """Rows of the prefix and substring tiers, best first.
+
+        These are table and postings lookups, cheap enough to answer on the
+        event loop; only fuzzy_rows needs the compute pool.
+        """
+        query_lower = query.strip().lower()
+        limit = max(1, min(limit, MAX_LIMIT))
+        if not query_lower:
+            return []
+
+        if len(query_lower) <= PRECOMPUTED_PREFIX_LEN:
+            rows = self.short_prefixes.get(query_lower, np.empty(0, dtype=np.int32))[:limit]
+        else:
+            rows = self._rank_prefix_range(query_lower, limit)
+        rows = rows.tolist()
+
+        if len(rows) < limit:
+            rows += self._substring_rows(query_lower, set(rows), limit - len(rows))
+        return rows
+
+    def fuzzy_rows(self, query, rows, limit=10):
+        """rows from indexed_rows, topped up to `limit` with fuzzy matches"""
+        query = query.strip()
+        limit = max(1, min(limit, MAX_LIMIT))
+        if not query or len(rows) >= limit:
+            return rows
+        return rows + self._fuzzy_rows(query, set(rows), limit - len(rows))
+
+    def suggestions(self, rows):
+        """Titles of the given rows"""
+        # Titles can repeat in the catalog; suggestions are unique strings
+        return list(dict.fromkeys(self.titles[row] for row in rows))
+
+    def suggest(self, query, limit=10):
+        """Return up to `limit` suggested titles for a partial query"""
+        return self.suggestions(self.fuzzy_rows(query, self.indexed_rows(query, limit), limit))
+
+
+def _flatten(lists):
+    """{key: int32 array} as (keys, offsets, concatenated values), CSR style"""
+    keys = list(lists)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(lists[k]) for k in keys], out=offsets[1:])
+    values = np.concatenate([lists[k] for k in keys]).astype(np.int32) if keys else np.empty(0, dtype=np.int32)
+    return keys, offsets, values
+
+
+def _unflatten(keys, offsets, values):
+    bounds = np.asarray(offsets).tolist()
+    return {key: values[bounds[i]:bounds[i + 1]] for i, key in enumerate(keys)}
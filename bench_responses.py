@@ -0,0 +1,98 @@
+"""CPU cost of building a MovieResponse list: pydantic path vs pre-encoded fragments.
+
+    python bench_responses.py [--movies 5000] [--requests 2000]
+
+The pydantic path is what the list endpoints used to do per request:
+movies_data.iloc[row] per result, pd.notna checks, MovieResponse objects,
+then response_model validation and JSON serialization as FastAPI does it.
+The fragment path splices poster URLs into MovieFragments bytes. Both are
+checked to produce the same JSON before timing.
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter
+
+from main import MovieResponse
+from movie_fragments import MovieFragments
+
+WORDS = "space time travel heist robot love war alien ship dream city crime king magic ocean".split()
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Science Fiction", "Thriller", "Romance"]
+
+
+def synthetic_movies(n, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'id': np.arange(1000, 1000 + n, dtype=np.int64),
+        'title': [f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}" for i in range(n)],
+        'overview': [" ".join(rng.choice(WORDS) for _ in range(40)) for _ in range(n)],
+        'director_name': [f"Director {rng.randint(1, 500)}" for _ in range(n)],
+        'vote_average': np.array([rng.uniform(3, 9) for _ in range(n)], dtype=np.float32),
+        'release_date': [f"{rng.randint(1950, 2016)}-01-01" for _ in range(n)],
+        'runtime': np.array([rng.randint(80, 180) for _ in range(n)], dtype=np.float32),
+        'tagline': ["A tagline" if i % 3 else "" for i in range(n)],
+        'genres_list': [rng.sample(GENRES, rng.randint(1, 3)) for _ in range(n)],
+    })
+
+
+def pydantic_path(movies_data, adapter, rows, poster_urls):
+    items = []
+    for i, row in enumerate(rows):
+        movie = movies_data.iloc[row]
+        items.append(MovieResponse(
+            id=int(movie['id']),
+            title=movie['title'],
+            overview=movie['overview'] if pd.notna(movie['overview']) else '',
+            poster_url=poster_urls[i],
+            vote_average=float(movie['vote_average']),
+            release_date=str(movie['release_date']),
+            genres=movie['genres_list'] if isinstance(movie['genres_list'], list) else [],
+            runtime=float(movie['runtime']) if pd.notna(movie['runtime']) else 0.0,
+            tagline=str(movie['tagline']) if pd.notna(movie['tagline']) else '',
+            director=str(movie['director_name']) if pd.notna(movie.get('director_name')) else ''
+        ))
+    # response_model: validate the returned objects, then serialize them
+    content = adapter.dump_python(adapter.validate_python([m.model_dump() for m in items]), mode='json')
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def cpu_per_request(fn, requests):
+    start = time.process_time()
+    for args in requests:
+        fn(*args)
+    return (time.process_time() - start) / len(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    movies_data = synthetic_movies(args.movies)
+    start = time.perf_counter()
+    fragments = MovieFragments(movies_data)
+    print(f"Encoded {len(fragments)} movie fragments in {time.perf_counter() - start:.3f}s")
+    adapter = TypeAdapter(list[MovieResponse])
+    rng = np.random.default_rng(0)
+
+    print(f"{'items':>6} {'pydantic us/req':>16} {'fragments us/req':>17} {'speedup':>8}")
+    for size in (5, 20, 100):
+        requests = []
+        for _ in range(args.requests):
+            rows = rng.choice(args.movies, size=size, replace=False).tolist()
+            requests.append((rows, [f"https://image.tmdb.org/t/p/w500/{r}.jpg" for r in rows]))
+        rows, urls = requests[0]
+        assert json.loads(pydantic_path(movies_data, adapter, rows, urls)) == json.loads(fragments.render(rows, urls))
+
+        slow = cpu_per_request(lambda r, u: pydantic_path(movies_data, adapter, r, u), requests)
+        fast = cpu_per_request(fragments.render, requests)
+        print(f"{size:>6} {slow * 1e6:>16.1f} {fast * 1e6:>17.1f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
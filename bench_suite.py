@@ -0,0 +1,359 @@
+"""Offline benchmark and load-test suite, with JSON results for catching regressions.
+
+    python bench_suite.py --data-dir . [--out bench_results.json] [--baseline previous.json]
+
+Two parts, each can be skipped with --skip-micro / --skip-load:
+
+- micro: loads the catalog in this process (timing every load phase) and
+  times title resolution, autocomplete, free-text search, similarity lookups,
+  credits parsing for /movie/{id} details and response rendering, one call
+  at a time.
+- load: starts tmdb_stub.py and the API under uvicorn against it, records
+  startup time and RSS, then drives every endpoint with --concurrency
+  clients. recommend_cold runs first with distinct titles, so it pays for
+  poster fetches; later scenarios mostly hit the poster cache.
+
+Latencies are reported as p50/p95/p99 with throughput. With --baseline, any
+p95 (or startup time, peak RSS) more than --tolerance above the baseline is
+listed and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+import httpx
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentiles(samples, scale, unit):
+    """count/mean/p50/p95/p99/max of samples (seconds), in unit after multiplying by scale"""
+    values = np.asarray(samples, dtype=np.float64) * scale
+    if not len(values):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        f"mean_{unit}": round(float(values.mean()), 3),
+        f"p50_{unit}": round(float(p50), 3),
+        f"p95_{unit}": round(float(p95), 3),
+        f"p99_{unit}": round(float(p99), 3),
+        f"max_{unit}": round(float(values.max()), 3),
+    }
+
+
+def rss_mb(pid=None):
+    """(current, peak) resident set size in MB from /proc, or (None, None) off Linux"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            fields = dict(line.split(':', 1) for line in f)
+    except OSError:
+        return None, None
+    return (round(int(fields['VmRSS'].split()[0]) / 1024, 1),
+            round(int(fields['VmHWM'].split()[0]) / 1024, 1))
+
+
+def typo(text, rng):
+    """text with two neighboring letters swapped"""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def sample_movies(data_dir, n, seed=0):
+    """n (id, title) pairs from the movies CSV"""
+    movies = pd.read_csv(os.path.join(data_dir, 'tmdb_5000_movies.csv'), usecols=['id', 'title'])
+    movies = movies.dropna().drop_duplicates('title')
+    movies = movies.sample(n=min(n, len(movies)), random_state=seed)
+    return [int(i) for i in movies['id']], [str(t) for t in movies['title']]
+
+
+def time_calls(fn, args_list):
+    """Per-call latency percentiles (microseconds) and calls per second"""
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    result = percentiles(samples, 1e6, "us")
+    result["ops_per_second"] = round(len(samples) / sum(samples), 1) if sum(samples) else 0.0
+    return result
+
+
+def run_micro(data_dir, iterations, seed=0):
+    """Load the catalog in-process and time the hot lookups behind each endpoint"""
+    from csv_pipeline import parse_credits_chunk
+
+    os.chdir(data_dir)
+    import main
+
+    start = time.perf_counter()
+    catalog = main.load_and_process_data()
+    catalog['dataset_version'] = 'bench'
+    snap = main.install_catalog(main.build_catalog_indexes(catalog))
+    load_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    n = len(snap.movies_data)
+    titles = snap.movies_data['title'].dropna().astype(str).tolist()
+    picks = [rng.choice(titles) for _ in range(iterations)]
+    genres = sorted(snap.genre_index.all_ranks)
+    rows = [rng.randrange(n) for _ in range(iterations)]
+    credits = pd.read_csv('tmdb_5000_credits.csv', usecols=['movie_id', 'cast', 'crew'], nrows=100)
+
+    benchmarks = {
+        "title_resolve_exact": (snap.title_index.resolve, [(t,) for t in picks]),
+        "title_resolve_normalized": (snap.title_index.resolve,
+                                     [(t.lower().replace('-', '').replace(' ', ''),) for t in picks]),
+        "title_resolve_fuzzy": (snap.title_index.resolve, [(typo(t, rng),) for t in picks]),
+        "title_resolve_miss": (snap.title_index.resolve,
+                               [(''.join(rng.choice('qxzjkv') for _ in range(10)),) for _ in picks]),
+        "autocomplete_prefix": (snap.autocomplete_index.suggest, [(t[:3], 10) for t in picks]),
+        "autocomplete_fuzzy": (snap.autocomplete_index.suggest, [(typo(t, rng)[:8], 10) for t in picks]),
+        "search": (snap.search_index.search, [(f"{t.split()[0]} {rng.choice(genres)}", 20) for t in picks]),
+        "similarity_lookup": (snap.neighbor_index.neighbors, [(row, 5) for row in rows]),
+        "similarity_batch_20": (snap.neighbor_index.neighbors_batch,
+                                [(rows[i:i + 20], 5) for i in range(0, iterations, 20)]),
+        "detail_parse_100_credits": (parse_credits_chunk, [(credits,)] * max(1, iterations // 100)),
+        "render_20_movies": (snap.movie_fragments.render,
+                             [(rows[i:i + 20], [""] * len(rows[i:i + 20])) for i in range(0, iterations, 20)]),
+    }
+    results = {}
+    for name, (fn, args_list) in benchmarks.items():
+        results[name] = time_calls(fn, args_list)
+        print(f"  {name:<26} p50 {results[name]['p50_us']:>9.1f}us  p95 {results[name]['p95_us']:>9.1f}us  "
+              f"p99 {results[name]['p99_us']:>9.1f}us")
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "movies": n,
+        "load_seconds": round(load_seconds, 3),
+        "load_phases": {phase: round(seconds, 3) for phase, seconds in main.load_timings.items()},
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "benchmarks": results,
+    }
+
+
+def wait_for(url, timeout, proc):
+    """Poll url until it answers 200; returns seconds waited"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{' '.join(proc.args)} exited with status {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def scenarios(ids, titles, genres, rng):
+    """name -> function(i) returning (method, path, json body) for the i-th request"""
+    warm_titles = titles[:50]
+    return {
+        "recommend_cold": lambda i: ("POST", "/recommend", {"title": titles[i % len(titles)]}),
+        "root": lambda i: ("GET", "/", None),
+        "recommend": lambda i: ("POST", "/recommend", {"title": warm_titles[i % len(warm_titles)]}),
+        "recommend_batch": lambda i: ("POST", "/recommend/batch",
+                                      {"titles": rng.sample(warm_titles, 10), "k": 5}),
+        "top_movies": lambda i: ("GET", "/top-movies", None),
+        "movie_detail": lambda i: ("GET", f"/movie/{ids[i % len(ids)]}", None),
+        "genres": lambda i: ("GET", "/genres", None),
+        "movies_by_genre": lambda i: ("GET", f"/movies-by-genre?genre={quote(rng.choice(genres))}"
+                                             f"&offset={20 * rng.randrange(3)}", None),
+        "movies": lambda i: ("GET", "/movies", None),
+        "autocomplete": lambda i: ("GET", f"/autocomplete?q={quote(titles[i % len(titles)][:3])}", None),
+        # A title word plus a genre, so most queries match many movies across several terms
+        "search": lambda i: ("GET", f"/search?q={quote(titles[i % len(titles)].split()[0] + ' ' + rng.choice(genres))}",
+                             None),
+        "posters": lambda i: ("POST", "/posters", {"ids": rng.sample(ids, 20)}),
+        "posters_warmup": lambda i: ("GET", "/posters/warmup", None),
+    }
+
+
+async def run_scenario(client, make_request, requests, concurrency):
+    """Send requests from concurrency clients; latency percentiles (ms), throughput and errors"""
+    samples, statuses = [], {}
+    queue = iter(range(requests))
+
+    async def worker():
+        for i in queue:
+            method, path, body = make_request(i)
+            start = time.perf_counter()
+            try:
+                status = (await client.request(method, path, json=body)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - start
+    result = percentiles(samples, 1e3, "ms")
+    result["requests_per_second"] = round(len(samples) / wall, 1) if wall else 0.0
+    result["errors"] = sum(count for status, count in statuses.items()
+                           if not (isinstance(status, int) and status < 400))
+    result["statuses"] = {str(status): count for status, count in statuses.items()}
+    return result
+
+
+async def drive_load(base_url, names, ids, titles, requests, concurrency, seed):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        genres = [g['name'] for g in (await client.get("/genres")).json()["genres"]]
+        plans = scenarios(ids, titles, genres, random.Random(seed))
+        results = {}
+        for name in names or plans:
+            results[name] = await run_scenario(client, plans[name], requests, concurrency)
+            r = results[name]
+            print(f"  {name:<18} p50 {r['p50_ms']:>8.1f}ms  p95 {r['p95_ms']:>8.1f}ms  "
+                  f"p99 {r['p99_ms']:>8.1f}ms  {r['requests_per_second']:>7.1f} req/s  {r['errors']} errors")
+        return results
+
+
+def run_load(args):
+    """Start the TMDB stub and the API, then run every load scenario against them"""
+    scratch = tempfile.mkdtemp(prefix="bench-")
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ,
+        TMDB_API_KEY="bench" if args.upstream == "api" else "",
+        TMDB_API_BASE=f"{stub_url}/3",
+        TMDB_WEB_BASE=stub_url,
+        POSTER_CACHE_DB=os.path.join(scratch, "poster_cache.sqlite3"),
+        POSTER_WARM="0",
+        MODEL_ARTIFACT_DIR=os.path.abspath(args.artifact) if args.artifact else os.path.join(scratch, "none"),
+    )
+    stub = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "tmdb_stub.py"), "--port", str(args.stub_port),
+                             "--latency-ms", str(args.stub_latency_ms), "--error-rate", str(args.stub_error_rate)])
+    server = None
+    try:
+        wait_for(f"{stub_url}/stats", 30, stub)
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--app-dir", REPO_DIR,
+                                   "--port", str(args.port), "--log-level", "warning"],
+                                  cwd=os.path.abspath(args.data_dir), env=env)
+        wait_for(f"{base_url}/", args.startup_timeout, server)
+        startup_seconds = time.perf_counter() - start
+        startup_rss, _ = rss_mb(server.pid)
+        print(f"  API ready in {startup_seconds:.2f}s, RSS {startup_rss} MB")
+
+        ids, titles = sample_movies(args.data_dir, args.requests, args.seed)
+        scenario_results = asyncio.run(drive_load(base_url, args.scenarios, ids, titles,
+                                                  args.requests, args.concurrency, args.seed))
+        rss, peak_rss = rss_mb(server.pid)
+        upstream = httpx.get(f"{stub_url}/stats").json()
+    finally:
+        for proc in (server, stub):
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+    return {
+        "startup_seconds": round(startup_seconds, 3),
+        "startup_rss_mb": startup_rss,
+        "rss_mb": rss,
+        "peak_rss_mb": peak_rss,
+        "concurrency": args.concurrency,
+        "requests_per_scenario": args.requests,
+        "upstream": upstream,
+        "scenarios": scenario_results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every metric that got worse than baseline by more than tolerance"""
+    checks = []
+    for part, key, metric in (("micro", "benchmarks", "p95_us"), ("load", "scenarios", "p95_ms")):
+        old = (baseline.get(part) or {}).get(key, {})
+        for name, new in ((results.get(part) or {}).get(key) or {}).items():
+            if name in old and metric in old[name] and metric in new:
+                checks.append((f"{part}.{name}.{metric}", old[name][metric], new[metric]))
+    for part, metric in (("micro", "load_seconds"), ("micro", "peak_rss_mb"),
+                         ("load", "startup_seconds"), ("load", "peak_rss_mb")):
+        old, new = (baseline.get(part) or {}).get(metric), (results.get(part) or {}).get(metric)
+        if old and new is not None:
+            checks.append((f"{part}.{metric}", old, new))
+    return [f"{name}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)"
+            for name, old, new in checks if old and new > old * (1 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark and load-test suite")
+    parser.add_argument("--data-dir", default=".", help="directory with the TMDB CSVs")
+    parser.add_argument("--artifact", default=None, help="model artifact for the API (default: load the CSVs)")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per microbenchmark")
+    parser.add_argument("--requests", type=int, default=300, help="requests per load scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="*", default=None, help="load scenarios to run (default: all)")
+    parser.add_argument("--upstream", choices=["api", "scrape"], default="api",
+                        help="poster source fetch_poster_upstream uses against the stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--stub-port", type=int, default=8901)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.data_dir = os.path.abspath(args.data_dir)
+    out = os.path.abspath(args.out)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        },
+    }
+    # The server is a separate process, so the micro part's in-process load does not skew its RSS
+    if not args.skip_load:
+        print("Load scenarios:")
+        results["load"] = run_load(args)
+    if not args.skip_micro:
+        print("Microbenchmarks:")
+        results["micro"] = run_micro(args.data_dir, args.iterations, args.seed)
+
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {out}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.tolerance:.0%} against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Building a served catalog: the CSV pipeline, the similarity model and the lookup indexes.
+
+build_catalog() turns the TMDB CSVs into the catalog dict (tables, neighbor,
+title and search indexes, tag vectors); build_catalog_indexes() adds the
+structures derived from those tables. The API (main.py), the offline
+artifact build (model_artifact.py) and incremental ingests
+(catalog_ingest.py) all go through here.
+"""
+import gc
+import os
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from autocomplete_index import AutocompleteIndex
+from csv_pipeline import load_catalog
+from detail_store import MAX_BYTES as DETAIL_CACHE_BYTES, MAX_ENTRIES as DETAIL_CACHE_ENTRIES
+from detail_store import DetailStore
+from genre_index import GenreIndex
+from movie_filters import MovieFilters
+from movie_fragments import MovieFragments
+from neighbor_index import build_neighbor_index
+from search_index import SearchIndex
+from title_index import TitleIndex
+
+SOURCE_FILES = ("tmdb_5000_movies.csv", "tmdb_5000_credits.csv")
+# Number of precomputed neighbors kept per movie
+NEIGHBOR_K = int(os.getenv("NEIGHBOR_K", "50"))
+# How neighbor lists are computed: "exact" or the approximate "ivf" (see neighbor_index.py)
+SIMILARITY_BACKEND = os.getenv("SIMILARITY_BACKEND", "exact")
+SIMILARITY_OPTIONS = {
+    "exact": {
+        "workers": int(os.getenv("BUILD_WORKERS", "1")),  # Processes computing neighbor blocks
+        "max_memory_mb": int(os.getenv("BUILD_MAX_MEMORY_MB", "1024")),  # Budget for dense similarity blocks
+    },
+    "ivf": {
+        "n_lists": int(os.getenv("IVF_LISTS", "0")) or None,  # Default sqrt(number of movies)
+        "n_probe": int(os.getenv("IVF_PROBES", "0")) or None,  # Default: chosen for target_recall
+        "target_recall": float(os.getenv("IVF_TARGET_RECALL", "0.95")),
+    },
+}
+
+
+def build_position_index(ids):
+    """Map each movie id to its first row position"""
+    positions = {}
+    for pos, movie_id in enumerate(ids.tolist()):
+        positions.setdefault(int(movie_id), pos)
+    return positions
+
+
+def build_catalog(movies_path=SOURCE_FILES[0], credits_path=SOURCE_FILES[1], workers=None, neighbor_k=None,
+                  backend=None, similarity_options=None, detail_cache_entries=DETAIL_CACHE_ENTRIES,
+                  detail_cache_bytes=DETAIL_CACHE_BYTES):
+    """Load and process movie data with memory optimizations.
+
+    Returns (catalog dict, seconds per phase). neighbor_k, backend and
+    similarity_options default to NEIGHBOR_K, SIMILARITY_BACKEND and its
+    SIMILARITY_OPTIONS entry.
+    """
+    # Each JSON cell is parsed once, in chunks spread over a process pool
+    movies_data, raw_movies, details, timings = load_catalog(movies_path, credits_path, workers=workers)
+
+    # Detail records go to disk; /movie/{id} parses them on demand
+    start = time.perf_counter()
+    movie_details = DetailStore.from_records(details, max_entries=detail_cache_entries,
+                                             max_bytes=detail_cache_bytes)
+    del details
+    timings['details'] = time.perf_counter() - start
+
+    # Memory optimization: Use smaller feature set and sparse matrices
+    start = time.perf_counter()
+    cv = CountVectorizer(max_features=1200, stop_words='english')
+    vectors = cv.fit_transform(movies_data['tags'])  # Keep sparse
+    tag_vocabulary = cv.get_feature_names_out().tolist()
+    timings['vectorize'] = time.perf_counter() - start
+
+    # Keep only the top-K neighbors per movie instead of the full N x N matrix
+    backend = backend or SIMILARITY_BACKEND
+    if similarity_options is None:
+        similarity_options = SIMILARITY_OPTIONS.get(backend, {})
+    print(f"Computing neighbor index ({backend})...")
+    start = time.perf_counter()
+    neighbor_index = build_neighbor_index(vectors, k=neighbor_k or NEIGHBOR_K, backend=backend,
+                                          **similarity_options)
+    timings['neighbors'] = time.perf_counter() - start
+
+    # Inverted index for /search, over the untruncated vocabulary
+    start = time.perf_counter()
+    search_index = SearchIndex.build(movies_data['search_text'])
+    timings['search_index'] = time.perf_counter() - start
+
+    # Drop text columns - no longer needed
+    movies_data = movies_data.drop(['tags', 'search_text'], axis=1)
+
+    # Tag counts are kept (sparse, small) so new movies can be vectorized later
+    tag_vectors = vectors.astype(np.int32)
+    del vectors, cv
+    gc.collect()
+
+    print(f"Neighbor index: {len(neighbor_index)} movies x {neighbor_index.k} neighbors, "
+          f"{neighbor_index.nbytes / 1024 / 1024:.1f} MB")
+
+    start = time.perf_counter()
+    title_index = TitleIndex(movies_data['title'].tolist())
+    timings['title_index'] = time.perf_counter() - start
+    print("Load phases: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
+    catalog = {
+        'movies_data': movies_data, 'raw_movies': raw_movies, 'movie_details': movie_details,
+        'neighbor_index': neighbor_index, 'title_index': title_index, 'tag_vectors': tag_vectors,
+        'tag_vocabulary': tag_vocabulary, 'search_index': search_index,
+    }
+    return catalog, timings
+
+
+def build_catalog_indexes(catalog):
+    """Add the lookup indexes derived from a catalog's tables to the catalog dict.
+
+    The autocomplete index and the movie fragments are kept when the catalog
+    already has them (load_artifact reads them prebuilt); they are the
+    slowest to build, about 0.45 s each on a 20k-movie catalog.
+    """
+    movies = catalog['movies_data']
+    vote_counts = movies['id'].map(
+        catalog['raw_movies'].drop_duplicates('id').set_index('id')['vote_count']
+    ).fillna(0)
+    catalog['vote_counts'] = vote_counts.to_numpy(dtype=np.int64)
+    catalog['movie_positions'] = build_position_index(movies['id'])
+    if catalog.get('autocomplete_index') is None:
+        catalog['autocomplete_index'] = AutocompleteIndex(catalog['title_index'], vote_counts)
+    catalog['genre_index'] = GenreIndex(movies['genres_list'], movies['vote_average'], vote_counts)
+    if catalog.get('movie_fragments') is None:
+        catalog['movie_fragments'] = MovieFragments(movies)
+    catalog['movie_filters'] = MovieFilters(movies, catalog['vote_counts'], catalog['tag_vectors'])
+    return catalog
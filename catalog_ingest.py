@@ -0,0 +1,221 @@
+"""Incremental catalog updates: add or correct movies without a full rebuild.
+
+New and changed movies are run through the same field extraction as the CSV
+pipeline (csv_pipeline.py), vectorized against the frozen vocabulary stored
+in the model artifact, and only their neighbor lists (plus the lists they
+now belong to) are recomputed. Apply a delta to the artifact on disk with:
+
+    python catalog_ingest.py delta.json [--artifact model_artifact]
+
+or to a running server with POST /admin/ingest. A delta is a JSON list of
+TMDB-style movie records: the columns of tmdb_5000_movies.csv plus `cast`
+and `crew` from tmdb_5000_credits.csv. List fields may be given as lists or
+as the JSON strings the CSVs use. A record whose id is already in the
+catalog replaces that movie; any other record is appended. Records with the
+wrong shape are rejected with ValueError before anything changes.
+
+Either way the delta is applied to the newest artifact version while holding
+artifact_lock, so concurrent ingests from several workers or processes do
+not lose each other's changes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+
+from catalog_build import build_catalog_indexes, build_position_index
+from csv_pipeline import prepare_frames
+from model_artifact import (DEFAULT_ARTIFACT_DIR, artifact_lock, artifact_version, current_artifact_path,
+                            load_artifact, save_artifact)
+from neighbor_index import normalize_vectors, patch_neighbor_index
+
+MOVIE_COLUMNS = ['id', 'title', 'overview', 'genres', 'keywords', 'vote_average', 'vote_count',
+                 'release_date', 'runtime', 'tagline', 'budget', 'revenue', 'status',
+                 'spoken_languages', 'production_companies']
+NUMERIC_COLUMNS = ['vote_average', 'vote_count', 'runtime', 'budget', 'revenue']
+TEXT_COLUMNS = ['title', 'overview', 'release_date', 'tagline', 'status']
+LIST_COLUMNS = ['genres', 'keywords', 'spoken_languages', 'production_companies', 'cast', 'crew']
+ITEM_TEXT_KEYS = ['name', 'character', 'job', 'department']  # String fields of list entries
+
+
+def _cell(value):
+    # List columns are JSON strings in the CSVs
+    if isinstance(value, list):
+        return json.dumps(value)
+    return np.nan if value is None else value
+
+
+def _check_record(movie_id, record):
+    """Raise ValueError unless the record's fields have the shapes the pipeline reads"""
+    for col in TEXT_COLUMNS:
+        value = record.get(col)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"Movie {movie_id}: {col} must be a string")
+    for col in NUMERIC_COLUMNS:
+        value = record.get(col)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float, str))):
+            raise ValueError(f"Movie {movie_id}: {col} must be a number")
+    for col in LIST_COLUMNS:
+        value = record.get(col)
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise ValueError(f"Movie {movie_id}: {col} is not valid JSON")
+        if value is None:
+            continue
+        if not isinstance(value, list):
+            raise ValueError(f"Movie {movie_id}: {col} must be a list")
+        for item in value:
+            if not isinstance(item, dict):
+                raise ValueError(f"Movie {movie_id}: {col} entries must be objects, got {item!r}")
+            for key in ITEM_TEXT_KEYS:
+                if item.get(key) is not None and not isinstance(item[key], str):
+                    raise ValueError(f"Movie {movie_id}: {col} entry {key} must be a string")
+
+
+def records_to_frames(records):
+    """Turn movie records into (movies, credits) frames shaped like the CSVs"""
+    by_id = {}
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError("Each movie record must be a JSON object")
+        try:
+            movie_id = int(record.get('id'))
+        except (TypeError, ValueError):
+            raise ValueError(f"Movie record has no valid id: {record.get('id')!r}")
+        if not isinstance(record.get('title'), str) or not record['title'].strip():
+            raise ValueError(f"Movie {movie_id} has no title")
+        _check_record(movie_id, record)
+        by_id[movie_id] = dict(record, id=movie_id)  # Last record for an id wins
+
+    movies = pd.DataFrame([{col: _cell(r.get(col)) for col in MOVIE_COLUMNS} for r in by_id.values()],
+                          columns=MOVIE_COLUMNS)
+    for col in NUMERIC_COLUMNS:
+        movies[col] = pd.to_numeric(movies[col], errors='coerce')
+    credits = pd.DataFrame([
+        {'movie_id': r['id'], 'title': r['title'], 'cast': _cell(r.get('cast')), 'crew': _cell(r.get('crew'))}
+        for r in by_id.values()
+    ], columns=['movie_id', 'title', 'cast', 'crew'])
+    return movies, credits
+
+
+def apply_records(catalog, records):
+    """Return (updated catalog, summary) with the records added or replaced.
+
+    catalog is a dict with movies_data, raw_movies, movie_details,
+    neighbor_index, title_index, tag_vectors, tag_vocabulary, search_index
+    and dataset_version (see DatasetSnapshot.catalog). It is not modified.
+    """
+    start = time.perf_counter()
+    movies, credits = records_to_frames(records)
+    new_data, new_raw, new_details = prepare_frames(movies, credits)
+    new_data = new_data.drop_duplicates('id').reset_index(drop=True)
+
+    old_data = catalog['movies_data']
+    old_n = len(old_data)
+    positions = build_position_index(old_data['id'])
+    # Row of every delta movie in the updated catalog: its old row or a new one at the end
+    delta_rows = []
+    appended = 0
+    for movie_id in new_data['id'].tolist():
+        row = positions.get(int(movie_id))
+        if row is None:
+            row = old_n + appended
+            appended += 1
+        delta_rows.append(row)
+    delta_rows = np.array(delta_rows, dtype=np.int64)
+    # Updated row i is taken from position order[i] of old rows followed by delta rows
+    order = np.arange(old_n + appended)
+    order[delta_rows] = old_n + np.arange(len(delta_rows))
+
+    combined = pd.concat([old_data, new_data[old_data.columns]], ignore_index=True)
+    movies_data = combined.take(order).reset_index(drop=True).astype(old_data.dtypes.to_dict())
+
+    old_raw = catalog['raw_movies']
+    raw_movies = pd.concat([old_raw[~old_raw['id'].isin(new_data['id'])], new_raw[old_raw.columns]],
+                           ignore_index=True)
+    movie_details = catalog['movie_details'].with_records(new_details)
+
+    cv = CountVectorizer(vocabulary=catalog['tag_vocabulary'], stop_words='english')
+    new_vectors = cv.transform(new_data['tags']).astype(np.int32)
+    tag_vectors = sp.vstack([catalog['tag_vectors'], new_vectors]).tocsr()[order]
+    neighbor_index = patch_neighbor_index(catalog['neighbor_index'], normalize_vectors(tag_vectors), delta_rows)
+    search_index = catalog['search_index'].with_documents(delta_rows, new_data['search_text'].tolist(),
+                                                          len(movies_data))
+
+    title_index = catalog['title_index'].copy()
+    for row in np.argsort(delta_rows, kind='stable').tolist():  # Appends must come in row order
+        title_index.set_title(int(delta_rows[row]), movies_data['title'].iat[delta_rows[row]])
+
+    digest = hashlib.sha1(catalog['dataset_version'].encode())
+    digest.update(json.dumps(records, sort_keys=True, default=str).encode())
+    updated = dict(
+        catalog, movies_data=movies_data, raw_movies=raw_movies, movie_details=movie_details,
+        neighbor_index=neighbor_index, title_index=title_index, tag_vectors=tag_vectors, search_index=search_index,
+        dataset_version=digest.hexdigest()[:16],
+        autocomplete_index=None, movie_fragments=None,  # Stale; rebuilt by build_catalog_indexes
+    )
+    summary = {
+        "added": appended,
+        "updated": len(delta_rows) - appended,
+        "movies": len(movies_data),
+        "dataset_version": updated['dataset_version'],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return updated, summary
+
+
+def ingest(artifact_dir, records, current=None, **load_options):
+    """Apply records to the newest catalog and save it as a new artifact version.
+
+    current is the catalog the caller already has loaded; it is used when it
+    is still the artifact's current version (or there is no artifact yet).
+    Otherwise the current version is loaded from disk first. Everything runs
+    under artifact_lock. Returns (updated catalog with its indexes built by
+    build_catalog_indexes, summary, artifact path).
+    """
+    with artifact_lock(artifact_dir):
+        path = current_artifact_path(artifact_dir)
+        base = current
+        if path is not None and (current is None or artifact_version(path) != current['dataset_version']):
+            artifact = load_artifact(artifact_dir, **load_options)
+            if artifact is not None:
+                base = dict(artifact, dataset_version=artifact['manifest']['dataset_version'],
+                            similarity=artifact['manifest'].get('similarity', {}))
+        if base is None:
+            raise LookupError(f"No model artifact in {artifact_dir}; run `python model_artifact.py build` first")
+        catalog, summary = apply_records(base, records)
+        build_catalog_indexes(catalog)
+        path = save_catalog(artifact_dir, catalog)
+    return catalog, summary, path
+
+
+def save_catalog(out_dir, catalog):
+    """Persist a catalog as a new model artifact version"""
+    return save_artifact(out_dir, catalog['movies_data'], catalog['neighbor_index'], catalog['title_index'],
+                         catalog['raw_movies'], catalog['movie_details'], catalog['tag_vectors'],
+                         catalog['tag_vocabulary'], catalog['dataset_version'], catalog.get('similarity'),
+                         catalog['search_index'], catalog.get('autocomplete_index'), catalog.get('movie_fragments'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add or correct movies in the model artifact")
+    parser.add_argument("delta", help="JSON file with a list of movie records")
+    parser.add_argument("--artifact", default=os.getenv("MODEL_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    args = parser.parse_args()
+
+    with open(args.delta) as f:
+        records = json.load(f)
+    try:
+        _, summary, path = ingest(args.artifact, records if isinstance(records, list) else [records])
+    except (LookupError, ValueError) as e:
+        parser.error(str(e))
+    print(f"Added {summary['added']}, updated {summary['updated']} movies in {summary['seconds']}s; "
+          f"wrote {path}")
@@ -0,0 +1,90 @@
+"""Bounded thread pool for the CPU-heavy parts of requests.
+
+Fuzzy title matching, autocomplete and free-text search run here instead of
+on the event loop, so one slow lookup does not hold up every other request's
+poster I/O. Threads rather than processes: the work reads the served
+snapshot's indexes, which would otherwise be copied into every process. The
+numpy parts release the GIL and the interpreter switches threads every few
+milliseconds, so the loop keeps running while a lookup is in progress.
+
+At most `workers` tasks run at once and `max_queue` more wait. Beyond that
+run() raises PoolFull right away, with a Retry-After estimate, instead of
+letting requests pile up behind the pool.
+"""
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Compute pool is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ComputePool:
+    def __init__(self, workers=4, max_queue=64, wait_histogram=None, rejected=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.wait_histogram = wait_histogram  # Seconds a task waited for a thread, by task
+        self.rejected = rejected  # Tasks turned away because the queue was full, by task
+        self.pending = 0  # Submitted and not finished; only changed on the event loop
+        self.avg_seconds = 0.001  # Moving average of task run time, for Retry-After
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compute")
+
+    @property
+    def running(self):
+        return min(self.pending, self.workers)
+
+    @property
+    def queued(self):
+        return max(0, self.pending - self.workers)
+
+    def retry_after(self):
+        """Whole seconds until the current queue should have drained"""
+        return max(1, math.ceil((self.queued + 1) * self.avg_seconds / self.workers))
+
+    async def run(self, task, fn, *args):
+        """fn(*args) on a pool thread; task labels the metrics"""
+        if self.pending >= self.workers + self.max_queue:
+            if self.rejected is not None:
+                self.rejected.inc(task=task)
+            raise PoolFull(self.retry_after())
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        times = []
+
+        def call():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                times.append((started - submitted, time.perf_counter() - started))
+
+        self.pending += 1
+        future = self._executor.submit(call)
+        # Counted down when the thread is done, even if the request was cancelled meanwhile
+        future.add_done_callback(lambda _: self._call_soon(loop, task, times))
+        return await asyncio.wrap_future(future)
+
+    def _call_soon(self, loop, task, times):
+        try:
+            loop.call_soon_threadsafe(self._finished, task, times)
+        except RuntimeError:
+            pass  # Loop already closed at shutdown
+
+    def _finished(self, task, times):
+        self.pending -= 1
+        if times:  # Empty when the task was cancelled before it started
+            waited, seconds = times[0]
+            self.avg_seconds += (seconds - self.avg_seconds) * 0.1
+            if self.wait_histogram is not None:
+                self.wait_histogram.observe(waited, task=task)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {"workers": self.workers, "running": self.running, "queued": self.queued,
+                "max_queue": self.max_queue, "avg_task_ms": round(self.avg_seconds * 1000, 3)}
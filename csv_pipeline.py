@@ -0,0 +1,224 @@
+"""Parallel, streaming parse of the TMDB CSVs into the tables the API serves.
+
+Both CSVs are read in chunks. The JSON cells of each chunk (genres, keywords,
+languages, companies, cast, crew) are parsed exactly once, on a process pool,
+and every derived field comes out of that single pass: genre and keyword
+names, top cast, director, key crew and the /movie/{id} records. Only the
+scalar columns of a chunk stay in the parent process, so the raw JSON of the
+whole catalog is never in memory at once. Pool processes are spawned, not
+forked: /admin/reload?source=csv runs this from a thread of the threaded
+server, and a forked child could inherit a lock some other thread held.
+"""
+import ast
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+CHUNK_ROWS = 1000  # CSV rows per parse task
+MOVIE_DTYPES = {
+    'budget': 'int32',
+    'revenue': 'int32',
+    'runtime': 'float32',
+    'vote_average': 'float32',
+    'vote_count': 'int32'
+}
+# Columns kept from tmdb_5000_movies.csv besides the parsed JSON ones
+MOVIE_SCALARS = ['id', 'title', 'overview', 'vote_average', 'vote_count', 'release_date',
+                 'runtime', 'tagline', 'budget', 'revenue', 'status']
+RAW_MOVIE_COLUMNS = ['id', 'vote_count', 'vote_average', 'release_date', 'runtime',
+                     'tagline', 'budget', 'revenue', 'status']
+
+KEY_CREW_JOBS = {'Director', 'Writer', 'Screenplay', 'Producer', 'Executive Producer',
+                 'Director of Photography', 'Original Music Composer', 'Editor'}
+EMPTY_DETAILS = {"cast": [], "crew": [], "budget": 0, "revenue": 0, "vote_count": 0,
+                 "spoken_languages": [], "production_companies": [], "status": ""}
+
+
+def parse_list(cell):
+    """Parse a JSON list cell into its object entries; Python-literal cells are accepted as a fallback"""
+    if not isinstance(cell, str):
+        return []
+    try:
+        data = json.loads(cell)
+    except ValueError:
+        try:
+            data = ast.literal_eval(cell)
+        except Exception:
+            return []
+    return [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+
+
+def _names(items, limit=None):
+    try:
+        return [item['name'] for item in items[:limit] if 'name' in item]
+    except Exception:
+        return []
+
+
+def _director(crew):
+    try:
+        for item in crew:
+            if item.get('job') == 'Director':
+                return item['name']
+    except Exception:
+        pass
+    return ''
+
+
+def parse_movies_chunk(chunk):
+    """(genres, keywords, spoken languages, companies) name lists per movie row"""
+    return [
+        (_names(parse_list(genres)), _names(parse_list(keywords)),
+         _names(parse_list(languages)), _names(parse_list(companies)))
+        for genres, keywords, languages, companies in zip(
+            chunk['genres'], chunk['keywords'], chunk['spoken_languages'], chunk['production_companies'])
+    ]
+
+
+def parse_credits_chunk(chunk):
+    """(movie_id, top 3 cast, director, top 10 cast with characters, key crew) per credits row"""
+    rows = []
+    for movie_id, cast, crew in zip(chunk['movie_id'], chunk['cast'], chunk['crew']):
+        cast, crew = parse_list(cast), parse_list(crew)
+        key_crew, seen = [], set()
+        for m in crew:
+            job, name = m.get('job', ''), m.get('name', '')
+            if job in KEY_CREW_JOBS and (name, job) not in seen:
+                key_crew.append({"name": name, "job": job})
+                seen.add((name, job))
+        rows.append((
+            int(movie_id),
+            _names(cast, 3),
+            _director(crew),
+            [{"name": m.get('name', ''), "character": m.get('character', '')} for m in cast[:10]],
+            key_crew,
+        ))
+    return rows
+
+
+def _parse_chunks(chunks, parse, keep, pool, max_pending):
+    """Yield (kept columns, parsed rows) per chunk in order, parsing on the pool"""
+    if pool is None:
+        for chunk in chunks:
+            yield chunk[keep], parse(chunk)
+        return
+    pending = deque()
+    for chunk in chunks:
+        pending.append((chunk[keep], pool.submit(parse, chunk)))
+        if len(pending) >= max_pending:
+            kept, future = pending.popleft()
+            yield kept, future.result()
+    while pending:
+        kept, future = pending.popleft()
+        yield kept, future.result()
+
+
+def derive_catalog(movies, movie_fields, credit_fields):
+    """Build (movies_data with tags and search_text, raw_movies, movie details) from parsed rows.
+
+    movies holds the MOVIE_SCALARS columns, movie_fields the matching
+    parse_movies_chunk() rows and credit_fields parse_credits_chunk() rows.
+    """
+    movies = movies.reset_index(drop=True)
+    credits = {}
+    for row in credit_fields:
+        credits.setdefault(row[0], row)  # First credits row per movie wins
+    no_credits = (None, [], '', [], [])
+    genres, keywords, languages, companies = (list(col) for col in zip(*movie_fields)) if movie_fields \
+        else ([], [], [], [])
+    movie_credits = [credits.get(int(movie_id), no_credits) for movie_id in movies['id'].tolist()]
+
+    details = {}
+    for r, langs, comps in zip(movies[['id', 'budget', 'revenue', 'vote_count', 'status']].itertuples(index=False),
+                               languages, companies):
+        details.setdefault(int(r.id), {
+            "cast": [],
+            "crew": [],
+            "budget": int(r.budget) if pd.notna(r.budget) else 0,
+            "revenue": int(r.revenue) if pd.notna(r.revenue) else 0,
+            "vote_count": int(r.vote_count) if pd.notna(r.vote_count) else 0,
+            "spoken_languages": langs,
+            "production_companies": comps,
+            "status": str(r.status) if pd.notna(r.status) else '',
+        })
+    for movie_id, (_, _, _, cast, crew) in credits.items():
+        record = details.setdefault(movie_id, dict(EMPTY_DETAILS, cast=[], crew=[]))
+        record["cast"], record["crew"] = cast, crew
+
+    # Remove spaces from names for better matching
+    def squash(names):
+        return ' '.join(name.replace(" ", "") for name in names)
+
+    overview = movies['overview'].fillna('')
+    tags = [
+        f"{text} {squash(g)} {squash(k)} {squash(c[1])} {c[2].replace(' ', '')}".lower()
+        for text, g, k, c in zip(overview.tolist(), genres, keywords, movie_credits)
+    ]
+    # Same fields with names left as words, for free-text search
+    search_text = [
+        f"{title} {text} {' '.join(g)} {' '.join(k)} {' '.join(c[1])} {c[2]}"
+        for title, text, g, k, c in zip(movies['title'].fillna('').tolist(), overview.tolist(),
+                                        genres, keywords, movie_credits)
+    ]
+    movies_data = pd.DataFrame({
+        'id': movies['id'],
+        'title': movies['title'],
+        'overview': overview,
+        'tags': tags,
+        'search_text': search_text,
+        'director_name': [c[2] for c in movie_credits],
+        'vote_average': movies['vote_average'].fillna(0.0).astype('float32'),
+        'release_date': movies['release_date'].fillna(''),
+        'runtime': movies['runtime'].fillna(0.0).astype('float32'),
+        'tagline': movies['tagline'].fillna(''),
+        'genres_list': genres,
+    })
+    return movies_data, movies[RAW_MOVIE_COLUMNS].copy(), details
+
+
+def load_catalog(movies_path, credits_path, workers=None, chunk_rows=CHUNK_ROWS):
+    """Stream both CSVs through the parse pool and derive the catalog tables.
+
+    Returns (movies_data with tags and search_text, raw_movies, movie details, timings),
+    where timings maps each phase to seconds.
+    """
+    workers = workers or os.cpu_count() or 1
+    timings = {}
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        start = time.perf_counter()
+        parts, movie_fields = [], []
+        chunks = pd.read_csv(movies_path, dtype=MOVIE_DTYPES, chunksize=chunk_rows)
+        for kept, parsed in _parse_chunks(chunks, parse_movies_chunk, MOVIE_SCALARS, pool, 2 * workers):
+            parts.append(kept)
+            movie_fields.extend(parsed)
+        movies = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=MOVIE_SCALARS)
+        timings['parse_movies'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        credit_fields = []
+        chunks = pd.read_csv(credits_path, usecols=['movie_id', 'cast', 'crew'], chunksize=chunk_rows)
+        for _, parsed in _parse_chunks(chunks, parse_credits_chunk, ['movie_id'], pool, 2 * workers):
+            credit_fields.extend(parsed)
+        timings['parse_credits'] = time.perf_counter() - start
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    start = time.perf_counter()
+    movies_data, raw_movies, details = derive_catalog(movies, movie_fields, credit_fields)
+    timings['derive'] = time.perf_counter() - start
+    return movies_data, raw_movies, details, timings
+
+
+def prepare_frames(movies, credits):
+    """derive_catalog() for in-memory frames shaped like the CSVs, parsed inline"""
+    movies = movies.reset_index(drop=True)
+    return derive_catalog(movies[MOVIE_SCALARS], parse_movies_chunk(movies), parse_credits_chunk(credits))
@@ -0,0 +1,99 @@
+"""Immutable, versioned catalog snapshots that can be swapped while serving.
+
+A DatasetSnapshot holds one version of the catalog tables and every index
+derived from them. Endpoints take the current snapshot once per request
+(main.use_snapshot) and only read from it, so a reload that installs a new
+snapshot never mixes versions inside a request: requests already in flight
+finish on the snapshot they started with. Each request holds a reference;
+a replaced snapshot is closed as soon as its last request releases it,
+which drops its tables, unmaps its artifact files and removes any
+temporary files it owns. When a request releases it on the event loop,
+that cleanup runs in a thread so the loop keeps serving.
+"""
+import asyncio
+import gc
+import time
+
+# Catalog dict keys (see catalog_build.build_catalog_indexes) exposed as attributes
+FIELDS = ('movies_data', 'raw_movies', 'movie_details', 'neighbor_index', 'title_index', 'tag_vectors',
+          'tag_vocabulary', 'search_index', 'vote_counts', 'movie_positions', 'autocomplete_index',
+          'genre_index', 'movie_fragments', 'movie_filters')
+
+
+class DatasetSnapshot:
+    def __init__(self, catalog, source="", generation=0):
+        for field in FIELDS:
+            object.__setattr__(self, field, catalog[field])
+        object.__setattr__(self, 'version', catalog['dataset_version'])
+        object.__setattr__(self, 'similarity', catalog.get('similarity') or {})
+        object.__setattr__(self, 'source', source)  # Artifact directory or "csv"
+        object.__setattr__(self, 'generation', generation)  # Install count in this worker
+        object.__setattr__(self, 'loaded_at', time.time())
+        object.__setattr__(self, '_state', {"refs": 0, "retired": False, "closed": False})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DatasetSnapshot is immutable; build a new one and install it")
+
+    def catalog(self):
+        """The catalog dict this snapshot was built from, e.g. for catalog_ingest.apply_records"""
+        catalog = {field: getattr(self, field) for field in FIELDS}
+        catalog.update(dataset_version=self.version, similarity=self.similarity)
+        return catalog
+
+    @property
+    def refs(self):
+        return self._state["refs"]
+
+    @property
+    def closed(self):
+        return self._state["closed"]
+
+    def acquire(self):
+        if self._state["closed"]:
+            raise RuntimeError(f"Snapshot {self.version} is already closed")
+        self._state["refs"] += 1
+        return self
+
+    def release(self):
+        self._state["refs"] -= 1
+        if self._state["retired"] and self._state["refs"] == 0:
+            self.close()
+
+    def retire(self):
+        """Mark as replaced; closes now if no request is using it, else after the last one"""
+        self._state["retired"] = True
+        if self._state["refs"] == 0:
+            self.close()
+
+    def close(self):
+        if self._state["closed"]:
+            return
+        self._state["closed"] = True
+        details = self.movie_details
+        for field in FIELDS:
+            object.__setattr__(self, field, None)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self._free(details)
+        else:
+            loop.run_in_executor(None, self._free, details)
+
+    def _free(self, details):
+        if hasattr(details, 'close'):
+            details.close()
+        del details
+        gc.collect()  # DataFrames hold reference cycles; free them now rather than at some later GC pass
+        print(f"Closed dataset snapshot {self.version} (generation {self.generation})")
+
+    def info(self):
+        return {
+            "dataset_version": self.version,
+            "generation": self.generation,
+            "source": self.source,
+            "movies": len(self.movies_data) if self.movies_data is not None else 0,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.refs,
+        }
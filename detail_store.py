@@ -0,0 +1,143 @@
+"""Disk-backed /movie/{id} records, parsed on access and kept in a bounded LRU.
+
+The cast, crew and extended metadata of every movie are only read by
+/movie/{id}, so they stay on disk instead of in each worker's heap:
+
+    details/
+        ids.npy         movie ids, sorted (int64)
+        offsets.npy     start/end of each record in records.npy (int64, n+1)
+        records.npy     zlib-compressed compact JSON records, back to back (uint8)
+
+The arrays are memory-mapped, so workers share the pages through the OS
+page cache. A lookup binary-searches the ids, decompresses and parses one
+record, and keeps it in an LRU bounded by entry count and by bytes.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_ENTRIES = 2000  # Parsed records kept per worker
+MAX_BYTES = 32 * 1024 * 1024  # Approximate memory for those records (JSON size x PARSED_OVERHEAD)
+PARSED_OVERHEAD = 4  # Python objects take roughly this many times their JSON size
+
+
+def write_details(directory, records):
+    """Write (movie id, record dict) pairs in the layout DetailStore reads"""
+    os.makedirs(directory, exist_ok=True)
+    records = sorted(((int(movie_id), record) for movie_id, record in records), key=lambda item: item[0])
+    blobs = [zlib.compress(json.dumps(record, separators=(',', ':')).encode('utf-8'), 6)
+             for _, record in records]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    np.save(os.path.join(directory, "ids.npy"), np.array([movie_id for movie_id, _ in records], dtype=np.int64))
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    np.save(os.path.join(directory, "records.npy"), np.frombuffer(b''.join(blobs), dtype=np.uint8))
+
+
+class DetailStore:
+    """Read-only mapping of movie id -> detail record over a details/ directory.
+
+    `overlay` holds records that replace or extend the ones on disk (see
+    with_records), so an ingest does not rewrite the files.
+    """
+
+    def __init__(self, directory, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, overlay=None, owned=None):
+        self.directory = directory
+        self.ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode='r')
+        self.records = np.load(os.path.join(directory, "records.npy"), mmap_mode='r')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.overlay = overlay or {}
+        self.cache = OrderedDict()  # movie id -> (record, approximate bytes)
+        self.cache_bytes = 0
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()  # save_catalog reads from a worker thread
+        self._owned = owned  # Temporary directory removed with the store
+
+    @classmethod
+    def from_records(cls, records, directory=None, **limits):
+        """Write records to directory (default: a temporary one) and open them"""
+        owned = None
+        if directory is None:
+            owned = directory = tempfile.mkdtemp(prefix="movie-details-")
+        write_details(directory, records.items() if isinstance(records, dict) else records)
+        return cls(directory, owned=owned, **limits)
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Drop the parsed records and remove the temporary directory, if this store owns one"""
+        self.cache.clear()
+        self.cache_bytes = 0
+        if self._owned:
+            shutil.rmtree(self._owned, ignore_errors=True)
+            self._owned = None
+
+    def _position(self, movie_id):
+        pos = int(np.searchsorted(self.ids, movie_id))
+        return pos if pos < len(self.ids) and self.ids[pos] == movie_id else None
+
+    def _read(self, pos):
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return zlib.decompress(self.records[start:end].tobytes())
+
+    def __len__(self):
+        return len(self.ids) + sum(1 for movie_id in self.overlay if self._position(movie_id) is None)
+
+    def __contains__(self, movie_id):
+        return movie_id in self.overlay or self._position(movie_id) is not None
+
+    def get(self, movie_id, default=None):
+        record = self.overlay.get(movie_id)
+        if record is not None:
+            return record
+        with self._lock:
+            entry = self.cache.get(movie_id)
+            if entry is not None:
+                self.cache.move_to_end(movie_id)
+                self.hits += 1
+                return entry[0]
+        pos = self._position(movie_id)
+        if pos is None:
+            return default
+        raw = self._read(pos)
+        record = json.loads(raw)
+        size = len(raw) * PARSED_OVERHEAD
+        with self._lock:
+            self.misses += 1
+            if movie_id not in self.cache:
+                self.cache[movie_id] = (record, size)
+                self.cache_bytes += size
+            while self.cache and (len(self.cache) > self.max_entries or self.cache_bytes > self.max_bytes):
+                _, (_, evicted) = self.cache.popitem(last=False)
+                self.cache_bytes -= evicted
+        return record
+
+    def items(self):
+        """Every (movie id, record), read from disk without touching the LRU"""
+        for pos, movie_id in enumerate(self.ids.tolist()):
+            if movie_id not in self.overlay:
+                yield movie_id, json.loads(self._read(pos))
+        yield from self.overlay.items()
+
+    def with_records(self, records):
+        """A new store over the same files with records added or replaced"""
+        return DetailStore(self.directory, self.max_entries, self.max_bytes,
+                           overlay={**self.overlay, **records}, owned=self._take_ownership())
+
+    def _take_ownership(self):
+        # The newer store keeps a temporary directory alive for both
+        owned, self._owned = self._owned, None
+        return owned
+
+    def stats(self):
+        return {"entries": len(self.cache), "bytes": self.cache_bytes, "hits": self.hits, "misses": self.misses,
+                "disk_bytes": int(self.records.nbytes)}
@@ -0,0 +1,71 @@
+"""Genre inverted index for /movies-by-genre and /genres, built once at load time"""
+import numpy as np
+
+MIN_VOTES = 100  # Genre listings prefer movies with at least this many votes
+
+
+class GenreIndex:
+    """Per-genre posting lists, pre-ranked by rating.
+
+    Every movie gets a rank: its position when the catalog is sorted by
+    vote_average, highest first (ties keep catalog order). Each genre stores
+    the sorted ranks of its movies, so any intersection or union of posting
+    lists is itself sorted by rating and a page is a plain slice. A second
+    set of lists holds only movies with at least MIN_VOTES votes.
+    """
+
+    def __init__(self, genres_lists, vote_average, vote_count, min_votes=MIN_VOTES):
+        vote_average = np.asarray(vote_average, dtype=np.float64)
+        vote_count = np.asarray(vote_count, dtype=np.int64)
+        self.rank_to_row = np.argsort(-vote_average, kind='stable').astype(np.int32)
+        row_to_rank = np.empty(len(self.rank_to_row), dtype=np.int32)
+        row_to_rank[self.rank_to_row] = np.arange(len(self.rank_to_row), dtype=np.int32)
+
+        rows_by_genre = {}
+        for row, genres in enumerate(genres_lists):
+            for genre in genres if isinstance(genres, list) else []:
+                rows_by_genre.setdefault(genre, []).append(row)
+
+        self.names = {}  # lowercase name -> display name
+        self.all_ranks = {}  # display name -> sorted ranks of every movie in the genre
+        self.qualified_ranks = {}  # display name -> sorted ranks with enough votes
+        for genre, rows in rows_by_genre.items():
+            rows = np.unique(np.array(rows, dtype=np.int32))
+            ranks = np.sort(row_to_rank[rows])
+            self.names.setdefault(genre.lower(), genre)
+            self.all_ranks[genre] = ranks
+            self.qualified_ranks[genre] = ranks[vote_count[self.rank_to_row[ranks]] >= min_votes]
+
+    def counts(self):
+        """[{"name", "count"}] for every genre, sorted by name"""
+        return [{"name": g, "count": int(len(self.all_ranks[g]))} for g in sorted(self.all_ranks)]
+
+    def resolve(self, genre):
+        """Display name for a case-insensitive genre name, or None"""
+        return self.names.get(genre.strip().lower())
+
+    @staticmethod
+    def _combine(lists, match_all):
+        combined = lists[0]
+        for other in lists[1:]:
+            combined = (np.intersect1d(combined, other, assume_unique=True) if match_all
+                        else np.union1d(combined, other))
+        return combined
+
+    def query(self, genres, match_all=False, offset=0, limit=20):
+        """Rows of movies in all (match_all) or any of the genres, best rated first.
+
+        Movies below the vote threshold are only used when no movie in the
+        selection meets it. Returns (rows for the page, total matches).
+        """
+        names = [self.resolve(g) for g in genres]
+        if match_all and None in names:
+            return np.empty(0, dtype=np.int32), 0
+        names = [n for n in dict.fromkeys(names) if n is not None]
+        if not names:
+            return np.empty(0, dtype=np.int32), 0
+
+        ranks = self._combine([self.qualified_ranks[n] for n in names], match_all)
+        if len(ranks) == 0:
+            ranks = self._combine([self.all_ranks[n] for n in names], match_all)
+        return self.rank_to_row[ranks[offset:offset + limit]], len(ranks)
@@ -1,27 +1,53 @@
 import pandas as pd
-import ast
 import os
 import re
-import json
+import secrets
 import asyncio
 import httpx
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel, Field
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-from scipy.sparse import csr_matrix
-from fuzzywuzzy import fuzz, process
 from dotenv import load_dotenv
-import gc
+import cProfile
+import time
+from autocomplete_index import MAX_LIMIT as AUTOCOMPLETE_MAX_LIMIT
+from catalog_build import build_catalog, build_catalog_indexes
+from poster_store import PosterStore
+from response_cache import ResponseCache
+from movie_fragments import dumps
+from poster_warmer import PosterWarmer, try_lock, warm_order
+from model_artifact import DEFAULT_ARTIFACT_DIR, artifact_version, current_artifact_path, dataset_fingerprint, load_artifact
+from catalog_ingest import ingest
+from csv_pipeline import EMPTY_DETAILS
+from compute_pool import ComputePool, PoolFull
+from dataset_snapshot import DatasetSnapshot
+import metrics
+import profiling
 
 load_dotenv()
 
 # TMDB Configuration
 TMDB_API_KEY = os.getenv("TMDB_API_KEY", "")
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w500"
-TMDB_API_BASE = "https://api.themoviedb.org/3"
+# Overridable so benchmarks can point at a local stand-in (see tmdb_stub.py)
+TMDB_API_BASE = os.getenv("TMDB_API_BASE", "https://api.themoviedb.org/3")
+TMDB_WEB_BASE = os.getenv("TMDB_WEB_BASE", "https://www.themoviedb.org")
+
+# Outbound TMDB requests share one keep-alive connection pool
+TMDB_MAX_CONCURRENCY = int(os.getenv("TMDB_MAX_CONCURRENCY", "16"))
+SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml",
+}
+
+# Processes parsing the CSVs (see csv_pipeline.py); default one per CPU
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or None
+# Prebuilt model artifact (see model_artifact.py); falls back to the CSVs if absent
+MODEL_ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+# Required in X-Admin-Token by /admin/* endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 app = FastAPI()
 
@@ -46,34 +72,157 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables to store processed data
-movies_data = None
-similarity_matrix = None
-raw_movies_cache = None  # Cache raw movies CSV to avoid reloading
-raw_credits_cache = None  # Cache credits CSV
-poster_cache = {}  # Cache poster URLs to avoid repeated API calls
-POSTER_CACHE_FILE = "poster_cache.json"
-
-def load_poster_cache():
-    """Load poster cache from JSON file for persistence across restarts"""
-    global poster_cache
-    try:
-        if os.path.exists(POSTER_CACHE_FILE):
-            with open(POSTER_CACHE_FILE, 'r') as f:
-                poster_cache = {int(k): v for k, v in json.load(f).items()}
-    except Exception:
-        poster_cache = {}
-
-def save_poster_cache():
-    """Save poster cache to JSON file"""
-    try:
-        with open(POSTER_CACHE_FILE, 'w') as f:
-            json.dump({str(k): v for k, v in poster_cache.items()}, f)
-    except Exception:
-        pass
+# The catalog and its indexes being served (see dataset_snapshot.py); swapped whole on reload
+snapshot = None
+snapshot_generation = 0  # Snapshots installed by this worker
+draining_snapshots = []  # Replaced snapshots that requests may still be using
+# Seconds between checks of the artifact's CURRENT pointer; a new version is loaded and swapped in
+ARTIFACT_WATCH_SECONDS = float(os.getenv("ARTIFACT_WATCH_SECONDS", "30"))
+artifact_watcher = None
+# Parsed detail records each worker keeps in memory (see detail_store.py)
+DETAIL_CACHE_ENTRIES = int(os.getenv("DETAIL_CACHE_ENTRIES", "2000"))
+DETAIL_CACHE_BYTES = int(float(os.getenv("DETAIL_CACHE_MB", "32")) * 1024 * 1024)
+load_timings = {}  # Seconds per phase of the last CSV load
+poster_store = None  # Poster URL cache shared by workers (see poster_store.py)
+POSTER_CACHE_DB = os.getenv("POSTER_CACHE_DB", "poster_cache.sqlite3")
+POSTER_CACHE_FILE = "poster_cache.json"  # Legacy cache, imported into the DB once
+# Longest an endpoint waits on TMDB for posters; slower fetches finish in the background
+POSTER_DEADLINE = float(os.getenv("POSTER_DEADLINE_MS", "300")) / 1000
+# Background poster warming after startup (see poster_warmer.py)
+POSTER_WARM = os.getenv("POSTER_WARM", "1") == "1"
+POSTER_WARM_LIMIT = int(os.getenv("POSTER_WARM_LIMIT", "0")) or None  # Default: whole catalog
+POSTER_WARM_CONCURRENCY = int(os.getenv("POSTER_WARM_CONCURRENCY", "4"))
+POSTER_WARM_RATE = float(os.getenv("POSTER_WARM_RATE", "5"))  # Upstream fetches per second
+poster_warmer = None  # Only set in the worker holding the warm-up lock
+poster_warm_lock = None  # Open lock file; closing it would let another worker warm
+# Pre-serialized bodies of catalog-static endpoints, with ETags
+response_cache = ResponseCache(max_age=int(os.getenv("RESPONSE_CACHE_MAX_AGE", "300")),
+                               max_entries=int(os.getenv("RESPONSE_CACHE_ENTRIES", "1000")),
+                               max_bytes=int(float(os.getenv("RESPONSE_CACHE_MB", "16")) * 1024 * 1024))
+http_client = None  # App-lifetime httpx.AsyncClient for TMDB
+tmdb_semaphore = None  # Bounds concurrent upstream TMDB requests
+poster_inflight = {}  # movie_id -> asyncio.Task, so concurrent misses share one fetch
+catalog_lock = asyncio.Lock()  # One catalog update (ingest or reload) at a time
+# Threads for fuzzy matching, autocomplete and search (see compute_pool.py); 0 runs them on the loop
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", "4"))
+COMPUTE_QUEUE = int(os.getenv("COMPUTE_QUEUE", "64"))  # Tasks waiting beyond that get a 503
+compute_pool = None
+
+# Prometheus metrics, served by GET /metrics (see metrics.py)
+REQUEST_SECONDS = metrics.Histogram("movie_api_request_seconds", "Request latency per endpoint",
+                                    ["endpoint", "method", "status"])
+STAGE_SECONDS = metrics.Histogram("movie_api_stage_seconds",
+                                  "Time per request stage: similarity, posters, serialization", ["stage"])
+TITLE_RESOLUTION_SECONDS = metrics.Histogram("movie_api_title_resolution_seconds",
+                                             "Title lookup time by the match that succeeded", ["match"])
+POSTER_LOOKUPS = metrics.Counter("movie_api_poster_cache_lookups_total",
+                                 "Poster cache lookups by result: hit, stale, miss", ["result"])
+RESPONSE_CACHE_LOOKUPS = metrics.Counter("movie_api_response_cache_lookups_total",
+                                         "Response cache lookups by result: hit, miss", ["result"])
+TMDB_SECONDS = metrics.Histogram("movie_api_tmdb_request_seconds", "Upstream TMDB request latency",
+                                 ["source"])
+TMDB_ERRORS = metrics.Counter("movie_api_tmdb_errors_total", "Failed upstream TMDB requests",
+                              ["source", "reason"])
+STARTUP_SECONDS = metrics.Gauge("movie_api_startup_phase_seconds", "Duration of each startup phase",
+                                ["phase"])
+metrics.Gauge("movie_api_poster_cache_entries", "Poster URLs in the cache",
+              function=lambda: len(poster_store) if poster_store is not None else None)
+metrics.Gauge("movie_api_detail_cache_entries", "Parsed movie detail records held in memory",
+              function=lambda: len(snapshot.movie_details.cache) if snapshot is not None else None)
+metrics.Gauge("movie_api_detail_cache_bytes", "Approximate memory of the parsed detail records",
+              function=lambda: snapshot.movie_details.cache_bytes if snapshot is not None else None)
+metrics.Gauge("movie_api_response_cache_entries", "Serialized responses in the response cache",
+              function=lambda: len(response_cache.entries))
+metrics.Gauge("movie_api_response_cache_bytes", "Total body size of the cached responses",
+              function=lambda: response_cache.bytes)
+DETAIL_LOOKUPS = metrics.Counter("movie_api_detail_cache_lookups_total",
+                                 "Movie detail lookups by result: hit, miss", ["result"])
+metrics.Gauge("movie_api_catalog_movies", "Movies in the served catalog",
+              function=lambda: len(snapshot.movies_data) if snapshot is not None else None)
+metrics.Gauge("movie_api_dataset_generation", "Dataset snapshots installed by this worker",
+              function=lambda: snapshot_generation)
+metrics.Gauge("movie_api_snapshots_draining", "Replaced dataset snapshots still used by requests",
+              function=lambda: sum(1 for s in draining_snapshots if not s.closed))
+COMPUTE_WAIT_SECONDS = metrics.Histogram("movie_api_compute_wait_seconds",
+                                         "Time CPU-bound tasks waited for a compute thread", ["task"])
+COMPUTE_REJECTED = metrics.Counter("movie_api_compute_rejected_total",
+                                   "CPU-bound tasks turned away because the compute queue was full", ["task"])
+metrics.Gauge("movie_api_compute_queue_depth", "CPU-bound tasks waiting for a compute thread",
+              function=lambda: compute_pool.queued if compute_pool is not None else None)
+metrics.Gauge("movie_api_compute_running", "CPU-bound tasks running on compute threads",
+              function=lambda: compute_pool.running if compute_pool is not None else None)
+metrics.Gauge("process_resident_memory_bytes", "Resident memory size in bytes",
+              function=metrics.resident_memory_bytes)
+app.add_middleware(metrics.RequestMetrics, histogram=REQUEST_SECONDS)
+
+# Profiles from X-Profile requests, slow requests and startup, read via /admin/profiles
+PROFILE_STARTUP = os.getenv("PROFILE_STARTUP", "0") == "1"  # Run startup under cProfile
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))  # Capture stacks above this; 0 (default) disables
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "0.1"))  # Share of requests watched
+profile_buffer = profiling.ProfileBuffer(int(os.getenv("PROFILE_BUFFER_SIZE", "50")))
+stack_sampler = profiling.StackSampler(interval=float(os.getenv("STACK_SAMPLE_INTERVAL_MS", "5")) / 1000)
+app.add_middleware(profiling.RequestProfiler, buffer=profile_buffer, sampler=stack_sampler,
+                   admin_token=lambda: ADMIN_TOKEN, slow_seconds=SLOW_REQUEST_MS / 1000,
+                   sample_rate=SLOW_REQUEST_SAMPLE_RATE)
+
+def get_http_client():
+    """Return the shared TMDB client, creating it on first use"""
+    global http_client, tmdb_semaphore
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=TMDB_MAX_CONCURRENCY,
+                max_keepalive_connections=TMDB_MAX_CONCURRENCY,
+                keepalive_expiry=30.0,
+            ),
+        )
+        tmdb_semaphore = asyncio.Semaphore(TMDB_MAX_CONCURRENCY)
+    return http_client
+
+async def close_http_client():
+    global http_client, tmdb_semaphore
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+        tmdb_semaphore = None
 
 class MovieRequest(BaseModel):
     title: str
+    k: int = Field(5, ge=1, le=50)
+    offset: int = Field(0, ge=0, le=500)
+    # Optional filters; every recommendation passes all of those given
+    genres: list[str] = Field(default_factory=list, max_length=20)
+    genre_match: str = Field("any", pattern="^(any|all)$")
+    year_min: int | None = Field(None, ge=1800, le=2200)
+    year_max: int | None = Field(None, ge=1800, le=2200)
+    min_rating: float | None = Field(None, ge=0, le=10)  # vote_average
+    min_votes: int | None = Field(None, ge=0)
+    runtime_min: float | None = Field(None, ge=0)  # Minutes
+    runtime_max: float | None = Field(None, ge=0)
+
+    def filters(self):
+        """Keyword arguments for MovieFilters.recommend, or {} when nothing is filtered"""
+        filters = {name: getattr(self, name) for name in
+                   ("year_min", "year_max", "min_rating", "min_votes", "runtime_min", "runtime_max")
+                   if getattr(self, name) is not None}
+        if self.genres:
+            filters.update(genres=self.genres, match_all=(self.genre_match == "all"))
+        return filters
+
+BATCH_MAX_ITEMS = 100  # Titles + ids accepted by /recommend/batch
+
+class PosterRequest(BaseModel):
+    ids: list[int] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class BatchRecommendRequest(BaseModel):
+    titles: list[str] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    ids: list[int] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    k: int = Field(5, ge=1, le=50)
+
+INGEST_MAX_MOVIES = 1000  # Movie records accepted per /admin/ingest call
+
+class IngestRequest(BaseModel):
+    movies: list[dict] = Field(..., min_length=1, max_length=INGEST_MAX_MOVIES)
 
 class MovieResponse(BaseModel):
     id: int
@@ -87,6 +236,13 @@ class MovieResponse(BaseModel):
     tagline: str = ""
     director: str = ""
 
+class BatchRecommendation(BaseModel):
+    query: str
+    id: int | None = None  # Movie the query resolved to
+    title: str = ""
+    recommendations: list[MovieResponse] = []
+    error: str = ""
+
 class CastMember(BaseModel):
     name: str
     character: str = ""
@@ -116,518 +272,661 @@ class MovieDetailResponse(BaseModel):
     status: str = ""
 
 def load_and_process_data():
-    """Load and process movie data with memory optimizations"""
-    global movies_data, similarity_matrix, raw_movies_cache, raw_credits_cache
-    
-    # Load datasets with optimized dtypes
-    dtypes_movies = {
-        'budget': 'int32',
-        'revenue': 'int32',
-        'runtime': 'float32',
-        'vote_average': 'float32',
-        'vote_count': 'int32'
+    """Build the catalog from the CSVs (see catalog_build.build_catalog), recording phase timings.
+
+    Returns the catalog dict (tables, neighbor/title/search indexes, tag
+    vectors); build_catalog_indexes adds the rest.
+    """
+    catalog, timings = build_catalog(workers=INGEST_WORKERS, detail_cache_entries=DETAIL_CACHE_ENTRIES,
+                                     detail_cache_bytes=DETAIL_CACHE_BYTES)
+    load_timings.update(timings)
+    return catalog
+
+def current_catalog():
+    """The catalog every endpoint is serving, as a dict (see install_catalog)"""
+    return snapshot.catalog()
+
+def install_catalog(catalog, source=""):
+    """Switch every endpoint to a catalog built by build_catalog_indexes.
+
+    The new snapshot replaces the old one in a single assignment. Requests
+    already holding the old snapshot finish on it; it is closed when the
+    last of them releases it.
+    """
+    global snapshot, snapshot_generation
+    snapshot_generation += 1
+    new = DatasetSnapshot(catalog, source=source, generation=snapshot_generation)
+    old, snapshot = snapshot, new
+    if old is not None:
+        draining_snapshots[:] = [s for s in draining_snapshots if not s.closed] + [old]
+        old.retire()
+    return new
+
+def load_dataset(from_csv=False):
+    """Build a catalog from the model artifact, or the CSVs when there is none (or from_csv).
+
+    Returns (catalog with indexes, source, phase timings). Runs without
+    touching the served snapshot, so it can run in a thread while serving.
+    """
+    start = time.perf_counter()
+    artifact = None if from_csv else load_artifact(MODEL_ARTIFACT_DIR, DETAIL_CACHE_ENTRIES, DETAIL_CACHE_BYTES)
+    if artifact is not None:
+        print(f"Memory-mapping model artifact {artifact['path']}...")
+        catalog = dict(artifact, dataset_version=artifact['manifest']['dataset_version'],
+                       similarity=artifact['manifest'].get('similarity', {}))
+        source = artifact['path']
+        phases = {'artifact': time.perf_counter() - start}
+    else:
+        print("Loading and processing movie data...")
+        catalog = load_and_process_data()
+        catalog['dataset_version'] = dataset_fingerprint()
+        source = "csv"
+        phases = dict(load_timings)
+    start = time.perf_counter()
+    build_catalog_indexes(catalog)
+    phases['catalog_indexes'] = time.perf_counter() - start
+    return catalog, source, phases
+
+async def reload_dataset(from_csv=False):
+    """Build the current dataset in a thread and swap it in; returns a summary"""
+    async with catalog_lock:
+        start = time.perf_counter()
+        catalog, source, phases = await asyncio.to_thread(load_dataset, from_csv)
+        # Taken before the swap: an old snapshot nobody is using is closed right away
+        previous = snapshot.info() if snapshot is not None else None
+        new = install_catalog(catalog, source)
+    print(f"Reloaded dataset {previous['dataset_version'] if previous else None} -> {new.version} "
+          f"from {source} in {time.perf_counter() - start:.1f}s")
+    return {
+        "previous": previous,
+        "current": new.info(),
+        "seconds": round(time.perf_counter() - start, 3),
+        "phases": {phase: round(seconds, 3) for phase, seconds in phases.items()},
     }
-    movies = pd.read_csv('tmdb_5000_movies.csv', dtype=dtypes_movies)
-    credits = pd.read_csv('tmdb_5000_credits.csv')
-    
-    # Cache raw data for later use (avoid reloading CSVs)
-    raw_movies_cache = movies[['id', 'vote_count', 'vote_average', 'release_date', 
-                                'genres', 'runtime', 'tagline', 'budget', 'revenue', 
-                                'status', 'spoken_languages', 'production_companies']].copy()
-    raw_credits_cache = credits[['movie_id', 'cast', 'crew']].copy()
-    
-    # Merge datasets (drop duplicate title column from credits)
-    credits_slim = credits[['movie_id', 'cast', 'crew']]
-    movies = movies.merge(credits_slim, left_on='id', right_on='movie_id', how='left')
-    del credits_slim  # Free memory
-    
-    # Select relevant columns
-    movies = movies[['id', 'title', 'overview', 'genres', 'keywords', 'cast', 'crew']]
-    
-    # Handle null values
-    movies['overview'] = movies['overview'].fillna('')
-    movies['genres'] = movies['genres'].fillna('[]')
-    movies['keywords'] = movies['keywords'].fillna('[]')
-    movies['cast'] = movies['cast'].fillna('[]')
-    movies['crew'] = movies['crew'].fillna('[]')
-    
-    # Convert JSON-like strings to lists
-    def parse_json_column(x):
-        try:
-            data = ast.literal_eval(x)
-            if isinstance(data, list):
-                return [item['name'] for item in data if 'name' in item]
-            return []
-        except:
-            return []
-    
-    movies['genres'] = movies['genres'].apply(parse_json_column)
-    movies['keywords'] = movies['keywords'].apply(parse_json_column)
-    
-    # Extract top 3 cast members
-    def get_cast(x):
-        try:
-            data = ast.literal_eval(x)
-            if isinstance(data, list):
-                return [item['name'] for item in data[:3] if 'name' in item]
-            return []
-        except:
-            return []
-    
-    # Save raw JSON strings for detail endpoint before processing
-    movies['cast_raw'] = movies['cast']
-    movies['crew_raw'] = movies['crew']
-    
-    movies['cast'] = movies['cast'].apply(get_cast)
-    
-    # Extract director
-    def get_director(x):
-        try:
-            data = ast.literal_eval(x)
-            if isinstance(data, list):
-                for item in data:
-                    if item.get('job') == 'Director':
-                        return [item['name']]
-            return []
-        except:
-            return []
-    
-    movies['director'] = movies['crew'].apply(get_director)
-    del movies['crew']  # Free memory - no longer needed
-    
-    # Save original director name before processing
-    movies['director_name'] = movies['director'].apply(lambda x: x[0] if len(x) > 0 else '')
-    
-    # Remove spaces from names for better matching
-    def remove_spaces(lst):
-        return [item.replace(" ", "") for item in lst]
-    
-    movies['genres'] = movies['genres'].apply(remove_spaces)
-    movies['keywords'] = movies['keywords'].apply(remove_spaces)
-    movies['cast'] = movies['cast'].apply(remove_spaces)
-    movies['director'] = movies['director'].apply(remove_spaces)
-    
-    # Create tags column
-    movies['tags'] = (
-        movies['overview'] + ' ' +
-        movies['genres'].apply(lambda x: ' '.join(x)) + ' ' +
-        movies['keywords'].apply(lambda x: ' '.join(x)) + ' ' +
-        movies['cast'].apply(lambda x: ' '.join(x)) + ' ' +
-        movies['director'].apply(lambda x: ' '.join(x))
-    )
-    
-    # Convert to lowercase
-    movies['tags'] = movies['tags'].apply(lambda x: x.lower())
-    
-    # Keep only required columns (NO raw cast/crew in memory)
-    movies_data = movies[['id', 'title', 'overview', 'tags', 'director_name']].copy()
-    del movies  # Free memory
-    
-    # Merge with cached raw data (already in memory)
-    movies_data = movies_data.merge(
-        raw_movies_cache[['id', 'vote_average', 'release_date', 'genres', 'runtime', 'tagline']],
-        on='id', how='left'
-    )
-    movies_data['vote_average'] = movies_data['vote_average'].fillna(0.0).astype('float32')
-    movies_data['release_date'] = movies_data['release_date'].fillna('')
-    movies_data['runtime'] = movies_data['runtime'].fillna(0.0).astype('float32')
-    movies_data['tagline'] = movies_data['tagline'].fillna('')
-    
-    # Parse genres into readable list
-    def parse_genres_readable(x):
+
+async def watch_artifact(interval):
+    """Reload when the artifact's CURRENT pointer moves to another dataset version"""
+    seen = current_artifact_path(MODEL_ARTIFACT_DIR)
+    while True:
+        await asyncio.sleep(interval)
+        if catalog_lock.locked():
+            continue  # An ingest or reload in this worker; look again next time
         try:
-            data = ast.literal_eval(x)
-            if isinstance(data, list):
-                return [item['name'] for item in data if 'name' in item]
-            return []
-        except:
-            return []
-    
-    movies_data['genres_list'] = movies_data['genres'].apply(parse_genres_readable)
-    movies_data = movies_data.drop('genres', axis=1)
-    
-    # Memory optimization: Use smaller feature set and sparse matrices
-    cv = CountVectorizer(max_features=1200, stop_words='english')
-    vectors = cv.fit_transform(movies_data['tags'])  # Keep sparse
-    
-    # Compute similarity in chunks to save memory, then convert to sparse
-    print("Computing similarity matrix...")
-    similarity_matrix = cosine_similarity(vectors, dense_output=False)  # Sparse output
-    
-    # Drop tags column - no longer needed
-    movies_data = movies_data.drop('tags', axis=1)
-    
-    # Force garbage collection
-    del vectors, cv
-    gc.collect()
-    
-    print(f"Similarity matrix shape: {similarity_matrix.shape}, format: {type(similarity_matrix)}")
-    return movies_data, similarity_matrix
+            path = current_artifact_path(MODEL_ARTIFACT_DIR)
+            if path == seen:
+                continue
+            seen = path
+            # The worker that saved an ingest is already serving that version
+            if path is not None and artifact_version(path) != snapshot.version:
+                await reload_dataset()
+        except Exception as e:
+            print(f"Artifact reload failed: {e}")
+
+async def use_snapshot():
+    """Dependency: the current snapshot, held until the endpoint has built its response"""
+    snap = snapshot
+    if snap is None:
+        raise HTTPException(status_code=503, detail="Data not loaded yet")
+    snap.acquire()
+    try:
+        yield snap
+    finally:
+        snap.release()
 
 @app.on_event("startup")
 async def startup_event():
     """Load data when the app starts"""
-    global movies_data, similarity_matrix
-    print("Loading and processing movie data...")
-    movies_data, similarity_matrix = load_and_process_data()
-    load_poster_cache()
-    print(f"Loaded {len(movies_data)} movies successfully!")
-    if poster_cache:
-        print(f"Loaded {len(poster_cache)} cached poster URLs.")
+    global poster_store, poster_warmer, poster_warm_lock, artifact_watcher, compute_pool
+    profiler = cProfile.Profile() if PROFILE_STARTUP else None
+    if profiler is not None:
+        profiler.enable()
+    started = time.perf_counter()
+    catalog, source, phases = load_dataset()
+    install_catalog(catalog, source)
+
+    start = time.perf_counter()
+    poster_store = PosterStore(POSTER_CACHE_DB, legacy_json=POSTER_CACHE_FILE)
+    poster_store.open()
+    poster_store.start()
+    phases['poster_store'] = time.perf_counter() - start
+    phases['total'] = time.perf_counter() - started
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.set(seconds, phase=phase)
+    if profiler is not None:
+        profiler.disable()
+        report_id = profile_buffer.add("startup", "startup", phases['total'], profiling.profile_report(profiler),
+                                       phases={phase: round(seconds, 3) for phase, seconds in phases.items()})
+        print(f"Startup profile stored as {report_id} (GET /admin/profiles/{report_id})")
+    print(f"Loaded {len(snapshot.movies_data)} movies successfully!")
+    if len(poster_store):
+        print(f"Loaded {len(poster_store)} cached poster URLs.")
     if not TMDB_API_KEY or TMDB_API_KEY == "your_tmdb_api_key_here":
         print("INFO: No TMDB API key — posters will be fetched from TMDB web pages.")
 
+    # One worker per box warms the poster cache; the others share its results
+    if POSTER_WARM:
+        poster_warm_lock = try_lock(f"{POSTER_CACHE_DB}.warm.lock")
+    if POSTER_WARM and poster_warm_lock is not None:
+        poster_warmer = PosterWarmer(fetch_poster_url, lambda movie_id: poster_store.get(movie_id) is not None,
+                                     concurrency=POSTER_WARM_CONCURRENCY, rate=POSTER_WARM_RATE)
+        poster_warmer.start(poster_warm_order(POSTER_WARM_LIMIT))
+
+    if ARTIFACT_WATCH_SECONDS > 0:
+        artifact_watcher = asyncio.create_task(watch_artifact(ARTIFACT_WATCH_SECONDS))
+    if COMPUTE_WORKERS > 0:
+        compute_pool = ComputePool(COMPUTE_WORKERS, COMPUTE_QUEUE, wait_histogram=COMPUTE_WAIT_SECONDS,
+                                   rejected=COMPUTE_REJECTED)
+
+def poster_warm_order(limit=None):
+    """Movie ids to warm, most visible first"""
+    return warm_order(snapshot.movies_data, snapshot.vote_counts, snapshot.genre_index, limit)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if artifact_watcher is not None:
+        artifact_watcher.cancel()
+    if poster_warmer is not None:
+        await poster_warmer.stop()
+    if poster_store is not None:
+        await poster_store.close()
+    await close_http_client()
+    if compute_pool is not None:
+        compute_pool.shutdown()
+
+def poster_fetch_task(movie_id: int):
+    """The upstream fetch for a movie, started unless one is already running"""
+    task = poster_inflight.get(movie_id)
+    if task is None:
+        task = asyncio.create_task(fetch_poster_upstream(movie_id))
+        poster_inflight[movie_id] = task
+        task.add_done_callback(lambda _: poster_inflight.pop(movie_id, None))
+    return task
+
 async def fetch_poster_url(movie_id: int) -> str:
+    """Return a movie's poster URL, sharing one upstream fetch between concurrent callers"""
+    cached = poster_store.get(movie_id)
+    if cached is not None:
+        return cached  # Fresh URL, or "" for a recent miss that is still backing off
+    # Shield so one cancelled caller does not cancel the fetch for everyone else
+    return await asyncio.shield(poster_fetch_task(movie_id))
+
+async def resolve_posters(movie_ids, deadline=None):
+    """Poster URLs for movie_ids, waiting at most `deadline` seconds on TMDB.
+
+    Cached answers are used as is. A stale URL is returned right away while
+    it is re-checked in the background. Other misses are fetched, and any
+    fetch not done by the deadline keeps running in the background to fill
+    the cache; its movie gets "" for now (clients can poll POST /posters).
+    """
+    deadline = POSTER_DEADLINE if deadline is None else deadline
+    start = time.perf_counter()
+    urls = {}
+    waiting = {}
+    for movie_id in movie_ids:
+        if movie_id in urls or movie_id in waiting:
+            continue
+        cached = poster_store.get(movie_id)
+        if cached is not None:
+            urls[movie_id] = cached
+            POSTER_LOOKUPS.inc(result="hit")
+            continue
+        task = poster_fetch_task(movie_id)
+        stale = poster_store.cached_url(movie_id)
+        if stale:
+            urls[movie_id] = stale
+            POSTER_LOOKUPS.inc(result="stale")
+        else:
+            waiting[movie_id] = task
+            POSTER_LOOKUPS.inc(result="miss")
+    if waiting:
+        done, _ = await asyncio.wait(set(waiting.values()), timeout=deadline)
+        for movie_id, task in waiting.items():
+            ok = task in done and not task.cancelled() and task.exception() is None
+            urls[movie_id] = task.result() if ok else poster_store.cached_url(movie_id)
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage="posters")
+    return [urls[movie_id] for movie_id in movie_ids]
+
+async def fetch_poster_upstream(movie_id: int) -> str:
     """Fetch movie poster URL from TMDB API or by scraping TMDB web page"""
-    if movie_id in poster_cache and poster_cache[movie_id]:
-        return poster_cache[movie_id]
-
+    client = get_http_client()
     poster_url = ""
+    failed = False
 
     # Method 1: TMDB API (if key is available)
     if TMDB_API_KEY and TMDB_API_KEY != "your_tmdb_api_key_here":
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{TMDB_API_BASE}/movie/{movie_id}",
-                    params={"api_key": TMDB_API_KEY},
-                    timeout=5.0
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    poster_path = data.get("poster_path", "")
-                    if poster_path:
-                        poster_url = f"{TMDB_IMAGE_BASE}{poster_path}"
+            async with tmdb_semaphore:
+                with TMDB_SECONDS.time(source="api"):
+                    response = await client.get(
+                        f"{TMDB_API_BASE}/movie/{movie_id}",
+                        params={"api_key": TMDB_API_KEY},
+                        timeout=5.0
+                    )
+            if response.status_code == 200:
+                data = response.json()
+                poster_path = data.get("poster_path", "")
+                if poster_path:
+                    poster_url = f"{TMDB_IMAGE_BASE}{poster_path}"
+            else:
+                failed = True
+                TMDB_ERRORS.inc(source="api", reason=response.status_code)
         except Exception as e:
+            failed = True
+            TMDB_ERRORS.inc(source="api", reason=type(e).__name__)
             print(f"API fetch failed for movie {movie_id}: {e}")
 
     # Method 2: Scrape TMDB movie page (no API key needed)
     if not poster_url:
         try:
-            async with httpx.AsyncClient(follow_redirects=True) as client:
-                response = await client.get(
-                    f"https://www.themoviedb.org/movie/{movie_id}",
-                    timeout=10.0,
-                    headers={
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                        "Accept": "text/html,application/xhtml+xml",
-                    }
-                )
-                if response.status_code == 200:
-                    # Extract poster image path from the TMDB page HTML
-                    match = re.search(
-                        r'https://media\.themoviedb\.org/t/p/w\d+(?:_and_h\d+_face)?(/[^"\'>\s]+\.(?:jpg|png))',
-                        response.text
+            async with tmdb_semaphore:
+                with TMDB_SECONDS.time(source="scrape"):
+                    response = await client.get(
+                        f"{TMDB_WEB_BASE}/movie/{movie_id}",
+                        timeout=10.0,
+                        headers=SCRAPE_HEADERS,
+                        follow_redirects=True,
                     )
-                    if match:
-                        poster_path = match.group(1)
-                        poster_url = f"{TMDB_IMAGE_BASE}{poster_path}"
+            if response.status_code == 200:
+                # Extract poster image path from the TMDB page HTML
+                match = re.search(
+                    r'https://media\.themoviedb\.org/t/p/w\d+(?:_and_h\d+_face)?(/[^"\'>\s]+\.(?:jpg|png))',
+                    response.text
+                )
+                if match:
+                    poster_path = match.group(1)
+                    poster_url = f"{TMDB_IMAGE_BASE}{poster_path}"
+            else:
+                failed = True
+                TMDB_ERRORS.inc(source="scrape", reason=response.status_code)
         except Exception as e:
+            failed = True
+            TMDB_ERRORS.inc(source="scrape", reason=type(e).__name__)
             print(f"Web scrape failed for movie {movie_id}: {e}")
 
     if poster_url:
-        poster_cache[movie_id] = poster_url
-        save_poster_cache()
-    return poster_url
+        poster_store.put(movie_id, poster_url)
+        return poster_url
+    # Remember the miss so the next request does not scrape again right away
+    poster_store.put_miss(movie_id, failure=failed)
+    return poster_store.cached_url(movie_id)
+
+def cached_response(request: Request, snap, key):
+    """Serve key from the response cache (200 or 304), or return None on a miss"""
+    entry = response_cache.get(key, (snap.version, poster_store.version))
+    RESPONSE_CACHE_LOOKUPS.inc(result="miss" if entry is None else "hit")
+    if entry is None:
+        return None
+    return response_cache.respond(entry, request.headers.get("if-none-match"))
+
+def cache_response(request: Request, snap, key, payload, headers=None):
+    """Serialize payload once, store it under key and send it"""
+    return cache_body(request, snap, key, dumps(payload).encode(), headers)
+
+def cache_body(request: Request, snap, key, body, headers=None, pending=False):
+    """Store an already encoded JSON body under key and send it.
+
+    A body with posters still being fetched is sent uncached (see json_body).
+    """
+    if pending:
+        return json_body(body, pending, headers)
+    entry = response_cache.put(key, body, (snap.version, poster_store.version), snap.version,
+                               headers)
+    return response_cache.respond(entry, request.headers.get("if-none-match"))
+
+def json_body(body, pending=False, headers=None):
+    """Send pre-encoded JSON as is, skipping response_model validation.
+
+    With posters pending, the client fills them in from POST /posters, so
+    neither browsers nor proxies may keep the copy with blanks.
+    """
+    headers = dict(headers or {})
+    if pending:
+        headers["Cache-Control"] = "no-store"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def poster_pending(movie_id, url):
+    """True when a blank poster is not a known miss, so a later poll may fill it in.
+
+    Decided from the poster store, not poster_inflight: a fetch's done-callback
+    can drop it from poster_inflight before this check, and one that finished
+    after the response was rendered has left a URL the response does not have.
+    """
+    return not url and poster_store.get(movie_id) != ""
+
+def posters_pending(movie_ids, poster_urls):
+    """True when any movie came back without a poster that may still arrive"""
+    return any(poster_pending(movie_id, url) for movie_id, url in zip(movie_ids, poster_urls))
+
+async def render_movies(snap, rows):
+    """(MovieResponse list JSON for movies_data rows with their posters, posters pending)"""
+    movie_ids = [int(snap.movie_fragments.ids[row]) for row in rows]
+    poster_urls = await resolve_posters(movie_ids)
+    with STAGE_SECONDS.time(stage="serialization"):
+        return snap.movie_fragments.render(rows, poster_urls), posters_pending(movie_ids, poster_urls)
+
+async def offload(task, fn, *args):
+    """Run CPU-bound fn(*args) on the compute pool; 503 with Retry-After when its queue is full"""
+    if compute_pool is None:
+        return fn(*args)
+    try:
+        return await compute_pool.run(task, fn, *args)
+    except PoolFull as e:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly",
+                            headers={"Retry-After": str(e.retry_after)})
+
+def timed_resolve(title_index, queries):
+    """[(row, match, seconds)] from title_index.resolve() for each query"""
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        row, match = title_index.resolve(query)
+        results.append((row, match, time.perf_counter() - start))
+    return results
+
+async def resolve_titles(snap, queries):
+    """Row per title query (None if not found), timed by the kind of match that succeeded.
+
+    Exact and normalized matches are dictionary lookups done inline; the
+    rest go through fuzzy and substring matching on the compute pool.
+    """
+    rows = [None] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        row, match = snap.title_index.resolve_exact(query)
+        if row is None:
+            pending.append(i)
+            continue
+        TITLE_RESOLUTION_SECONDS.observe(time.perf_counter() - start, match=match)
+        rows[i] = row
+    if pending:
+        results = await offload("title_resolution", timed_resolve, snap.title_index, [queries[i] for i in pending])
+        for i, (row, match, seconds) in zip(pending, results):
+            TITLE_RESOLUTION_SECONDS.observe(seconds, match=match or "none")
+            rows[i] = row
+    return rows
 
 @app.get("/")
 async def root():
-    return {"message": "Movie Recommendation API", "movies_count": len(movies_data) if movies_data is not None else 0}
+    snap = snapshot
+    return {"message": "Movie Recommendation API", "movies_count": len(snap.movies_data) if snap is not None else 0}
 
 @app.post("/recommend", response_model=list[MovieResponse])
-async def recommend_movies(request: MovieRequest):
-    """Recommend movies based on the input movie title"""
-    global movies_data, similarity_matrix
-    
-    if movies_data is None or similarity_matrix is None:
-        raise HTTPException(status_code=503, detail="Data not loaded yet")
-    
-    # Find the movie
-    movie_title = request.title.strip()
-    
-    # Create a normalized version for better matching (remove spaces, hyphens, etc.)
-    def normalize_title(title):
-        return title.lower().replace(" ", "").replace("-", "").replace(":", "").replace("'", "")
-    
-    normalized_input = normalize_title(movie_title)
-    
-    # Case-insensitive exact match
-    movie_matches = movies_data[movies_data['title'].str.lower() == movie_title.lower()]
-    
-    if movie_matches.empty:
-        # Try normalized match (e.g., "SpiderMan" matches "Spider-Man")
-        movies_data['normalized'] = movies_data['title'].apply(normalize_title)
-        movie_matches = movies_data[movies_data['normalized'] == normalized_input]
-        
-        if movie_matches.empty:
-            # Try fuzzy matching with high threshold
-            all_titles = movies_data['title'].tolist()
-            best_match = process.extractOne(movie_title, all_titles, scorer=fuzz.token_sort_ratio)
-            
-            if best_match and best_match[1] >= 70:  # 70% similarity threshold
-                movie_matches = movies_data[movies_data['title'] == best_match[0]]
-            else:
-                # Last resort: partial match
-                movie_matches = movies_data[movies_data['title'].str.lower().str.contains(movie_title.lower(), na=False)]
-                
-                if movie_matches.empty:
-                    raise HTTPException(status_code=404, detail=f"Movie '{movie_title}' not found. Try searching from the suggestions.")
-    
-    # Get the first match
-    movie_idx = movie_matches.index[0]
-    
-    # Get similarity scores (handle sparse matrix)
-    distances = similarity_matrix[movie_idx].toarray().flatten() if hasattr(similarity_matrix[movie_idx], 'toarray') else similarity_matrix[movie_idx]
-    
-    # Get top 6 similar movies (including the movie itself)
-    movie_indices = np.argsort(distances)[::-1][1:6]  # Skip the first one (itself)
-    
-    # Fetch all poster URLs in parallel for faster loading
-    movie_indices_list = list(movie_indices)
-    poster_tasks = [fetch_poster_url(int(movies_data.iloc[idx]['id'])) for idx in movie_indices_list]
-    poster_urls = await asyncio.gather(*poster_tasks)
-
-    # Prepare response
-    recommendations = []
-    for i, idx in enumerate(movie_indices_list):
-        movie = movies_data.iloc[idx]
-        recommendations.append(MovieResponse(
-            id=int(movie['id']),
-            title=movie['title'],
-            overview=movie['overview'] if pd.notna(movie['overview']) else 'No overview available',
-            poster_url=poster_urls[i],
-            vote_average=float(movie['vote_average']),
-            release_date=str(movie['release_date']),
-            genres=movie['genres_list'] if isinstance(movie['genres_list'], list) else [],
-            runtime=float(movie['runtime']) if pd.notna(movie['runtime']) else 0.0,
-            tagline=str(movie['tagline']) if pd.notna(movie['tagline']) else '',
-            director=str(movie['director_name']) if pd.notna(movie.get('director_name')) else ''
-        ))
+async def recommend_movies(request: MovieRequest, snap: DatasetSnapshot = Depends(use_snapshot)):
+    """Recommend movies based on the input movie title.
 
-    return recommendations
+    k and offset page through the most similar movies; the filters are
+    applied before paging.
+    """
+    # Find the movie: exact, normalized ("SpiderMan" -> "Spider-Man"), fuzzy, then substring
+    movie_title = request.title.strip()
+    movie_idx, = await resolve_titles(snap, [movie_title])
+    if movie_idx is None:
+        raise HTTPException(status_code=404, detail=f"Movie '{movie_title}' not found. Try searching from the suggestions.")
+    
+    # Neighbors are precomputed and already exclude the movie itself
+    filters = request.filters()
+    need = request.offset + request.k
+    with STAGE_SECONDS.time(stage="similarity"):
+        if filters or need > snap.neighbor_index.k:
+            movie_indices = await offload("recommend", snap.movie_filters.recommend, snap.neighbor_index,
+                                          movie_idx, request.k, request.offset, filters)
+        else:
+            movie_indices = snap.neighbor_index.neighbors(movie_idx, need)[request.offset:].tolist()
+    
+    # Posters are fetched in parallel and spliced into pre-encoded movie JSON
+    return json_body(*await render_movies(snap, movie_indices))
+
+@app.post("/recommend/batch", response_model=list[BatchRecommendation])
+async def recommend_batch(request: BatchRecommendRequest, snap: DatasetSnapshot = Depends(use_snapshot)):
+    """Recommend movies for many titles and/or movie ids in one call"""
+    if len(request.titles) + len(request.ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {BATCH_MAX_ITEMS} titles and ids per batch")
+
+    # Resolve every query to a row position (None if not found)
+    titles = [t.strip() for t in request.titles]
+    queries = list(zip(titles, await resolve_titles(snap, titles)))
+    queries += [(str(movie_id), snap.movie_positions.get(movie_id)) for movie_id in request.ids]
+    found = [row for _, row in queries if row is not None]
+
+    # One gather of k neighbors for every resolved movie
+    with STAGE_SECONDS.time(stage="similarity"):
+        neighbor_rows = snap.neighbor_index.neighbors_batch(found, request.k) if found \
+            else np.empty((0, 0), dtype=np.int32)
+
+    # Each distinct recommended movie gets one poster lookup for the whole batch
+    fragments = snap.movie_fragments
+    unique_rows = np.unique(neighbor_rows[neighbor_rows >= 0]).tolist()
+    movie_ids = [int(fragments.ids[row]) for row in unique_rows]
+    poster_urls = await resolve_posters(movie_ids)
+
+    # Same JSON as BatchRecommendation, assembled from the pre-encoded items
+    start = time.perf_counter()
+    items = {row: fragments.item(row, url) for row, url in zip(unique_rows, poster_urls)}
+    parts = []
+    found_iter = iter(neighbor_rows.tolist())
+    for query, row in queries:
+        if row is None:
+            error = f"Movie '{query}' not found"
+            parts.append(f'{{"query":{dumps(query)},"id":null,"title":"","recommendations":[],'
+                         f'"error":{dumps(error)}}}'.encode())
+            continue
+        recommendations = b','.join(items[r] for r in next(found_iter) if r >= 0)
+        parts.append(f'{{"query":{dumps(query)},"id":{int(fragments.ids[row])},'
+                     f'"title":{dumps(fragments.titles[row])},"recommendations":['.encode()
+                     + recommendations + b'],"error":""}')
+    body = b'[' + b','.join(parts) + b']'
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage="serialization")
+    return json_body(body, posters_pending(movie_ids, poster_urls))
 
 @app.get("/top-movies", response_model=list[MovieResponse])
-async def get_top_movies():
+async def get_top_movies(request: Request, snap: DatasetSnapshot = Depends(use_snapshot)):
     """Get top 20 highest rated movies (min 1000 votes for quality filter)"""
-    global movies_data
+    key = ("top-movies",)
+    cached = cached_response(request, snap, key)
+    if cached is not None:
+        return cached
 
-    if movies_data is None:
-        raise HTTPException(status_code=503, detail="Data not loaded yet")
+    ratings = snap.movies_data['vote_average'].reset_index(drop=True)
+    rows = ratings[snap.vote_counts >= 1000].nlargest(20).index.tolist()
 
-    # Use cached raw data instead of reloading CSV
-    merged = movies_data.merge(raw_movies_cache[['id', 'vote_count']], on='id', how='left')
-    qualified = merged[merged['vote_count'] >= 1000].nlargest(20, 'vote_average')
+    body, pending = await render_movies(snap, rows)
+    return cache_body(request, snap, key, body, pending=pending)
 
-    # Fetch posters in parallel
-    ids = [int(row['id']) for _, row in qualified.iterrows()]
-    poster_urls = await asyncio.gather(*[fetch_poster_url(mid) for mid in ids])
+@app.get("/movie/{movie_id}", response_model=MovieDetailResponse)
+async def get_movie_detail(movie_id: int, snap: DatasetSnapshot = Depends(use_snapshot)):
+    """Get full details for a single movie including cast & crew"""
+    pos = snap.movie_positions.get(movie_id)
+    if pos is None:
+        raise HTTPException(status_code=404, detail="Movie not found")
 
-    results = []
-    for i, (_, movie) in enumerate(qualified.iterrows()):
-        results.append(MovieResponse(
-            id=int(movie['id']),
+    movie = snap.movies_data.iloc[pos]
+    DETAIL_LOOKUPS.inc(result="hit" if movie_id in snap.movie_details.cache else "miss")
+    details = snap.movie_details.get(movie_id, EMPTY_DETAILS)
+
+    poster_url = (await resolve_posters([movie_id]))[0]
+
+    with STAGE_SECONDS.time(stage="serialization"):
+        return MovieDetailResponse(
+            id=movie_id,
             title=movie['title'],
             overview=movie['overview'] if pd.notna(movie['overview']) else '',
-            poster_url=poster_urls[i],
+            poster_url=poster_url,
             vote_average=float(movie['vote_average']),
             release_date=str(movie['release_date']),
             genres=movie['genres_list'] if isinstance(movie['genres_list'], list) else [],
             runtime=float(movie['runtime']) if pd.notna(movie['runtime']) else 0.0,
             tagline=str(movie['tagline']) if pd.notna(movie['tagline']) else '',
-            director=str(movie['director_name']) if pd.notna(movie.get('director_name')) else ''
-        ))
-    return results
-
-@app.get("/movie/{movie_id}", response_model=MovieDetailResponse)
-async def get_movie_detail(movie_id: int):
-    """Get full details for a single movie including cast & crew"""
-    global movies_data
-
-    if movies_data is None:
-        raise HTTPException(status_code=503, detail="Data not loaded yet")
-
-    movie_row = movies_data[movies_data['id'] == movie_id]
-    if movie_row.empty:
-        raise HTTPException(status_code=404, detail="Movie not found")
-
-    movie = movie_row.iloc[0]
-
-    # Parse cast — top 10 with character names (load from cached credits)
-    cast_list = []
-    try:
-        credits_row = raw_credits_cache[raw_credits_cache['movie_id'] == movie_id]
-        if not credits_row.empty:
-            raw_cast = ast.literal_eval(credits_row.iloc[0]['cast']) if isinstance(credits_row.iloc[0]['cast'], str) else []
-            for c in raw_cast[:10]:
-                cast_list.append(CastMember(
-                    name=c.get('name', ''),
-                    character=c.get('character', '')
-                ))
-    except Exception:
-        pass
-
-    # Parse crew — director, writers, producers, cinematographer, composer
-    crew_list = []
-    KEY_JOBS = {'Director', 'Writer', 'Screenplay', 'Producer', 'Executive Producer',
-                'Director of Photography', 'Original Music Composer', 'Editor'}
-    try:
-        credits_row = raw_credits_cache[raw_credits_cache['movie_id'] == movie_id]
-        if not credits_row.empty:
-            raw_crew = ast.literal_eval(credits_row.iloc[0]['crew']) if isinstance(credits_row.iloc[0]['crew'], str) else []
-            seen = set()
-            for c in raw_crew:
-                job = c.get('job', '')
-                name = c.get('name', '')
-                if job in KEY_JOBS and (name, job) not in seen:
-                    crew_list.append(CrewMember(name=name, job=job))
-                    seen.add((name, job))
-    except Exception:
-        pass
-
-    # Get extra fields from cached raw data
-    raw_row = raw_movies_cache[raw_movies_cache['id'] == movie_id]
-    budget = revenue = vote_count = 0
-    spoken_languages = []
-    production_companies = []
-    status = ""
-    if not raw_row.empty:
-        r = raw_row.iloc[0]
-        budget = int(r['budget']) if pd.notna(r['budget']) else 0
-        revenue = int(r['revenue']) if pd.notna(r['revenue']) else 0
-        vote_count = int(r['vote_count']) if pd.notna(r['vote_count']) else 0
-        status = str(r['status']) if pd.notna(r['status']) else ''
-        try:
-            spoken_languages = [l['name'] for l in ast.literal_eval(r['spoken_languages'])]
-        except Exception:
-            pass
-        try:
-            production_companies = [c['name'] for c in ast.literal_eval(r['production_companies'])]
-        except Exception:
-            pass
-
-    poster_url = await fetch_poster_url(movie_id)
-
-    return MovieDetailResponse(
-        id=movie_id,
-        title=movie['title'],
-        overview=movie['overview'] if pd.notna(movie['overview']) else '',
-        poster_url=poster_url,
-        vote_average=float(movie['vote_average']),
-        vote_count=vote_count,
-        release_date=str(movie['release_date']),
-        genres=movie['genres_list'] if isinstance(movie['genres_list'], list) else [],
-        runtime=float(movie['runtime']) if pd.notna(movie['runtime']) else 0.0,
-        tagline=str(movie['tagline']) if pd.notna(movie['tagline']) else '',
-        director=str(movie['director_name']) if pd.notna(movie.get('director_name')) else '',
-        cast=cast_list,
-        crew=crew_list,
-        budget=budget,
-        revenue=revenue,
-        spoken_languages=spoken_languages,
-        production_companies=production_companies,
-        status=status,
-    )
+            director=str(movie['director_name']) if pd.notna(movie.get('director_name')) else '',
+            **details,
+        )
 
 @app.get("/genres")
-async def get_genres():
+async def get_genres(request: Request, snap: DatasetSnapshot = Depends(use_snapshot)):
     """Get all unique genres with movie counts"""
-    global movies_data
+    key = ("genres",)
+    cached = cached_response(request, snap, key)
+    if cached is not None:
+        return cached
 
-    if movies_data is None:
-        raise HTTPException(status_code=503, detail="Data not loaded yet")
-
-    genre_counts = {}
-    for genres_list in movies_data['genres_list']:
-        if isinstance(genres_list, list):
-            for g in genres_list:
-                genre_counts[g] = genre_counts.get(g, 0) + 1
-
-    genres = [{"name": name, "count": count} for name, count in sorted(genre_counts.items())]
-    return {"genres": genres}
+    return cache_response(request, snap, key, {"genres": snap.genre_index.counts()})
 
 
 @app.get("/movies-by-genre", response_model=list[MovieResponse])
-async def get_movies_by_genre(genre: str = Query(..., min_length=1)):
-    """Get top movies for a specific genre, sorted by rating"""
-    global movies_data
-
-    if movies_data is None:
-        raise HTTPException(status_code=503, detail="Data not loaded yet")
-
-    genre_lower = genre.strip().lower()
-    mask = movies_data['genres_list'].apply(
-        lambda gs: any(g.lower() == genre_lower for g in gs) if isinstance(gs, list) else False
-    )
-    filtered = movies_data[mask].copy()
-
-    if filtered.empty:
-        raise HTTPException(status_code=404, detail=f"No movies found for genre '{genre}'")
-
-    # Get vote counts from cache instead of reloading CSV
-    filtered = filtered.merge(raw_movies_cache[['id', 'vote_count']], on='id', how='left')
-    qualified = filtered[filtered['vote_count'] >= 100].nlargest(20, 'vote_average')
-    if qualified.empty:
-        qualified = filtered.nlargest(20, 'vote_average')
-
-    ids = [int(row['id']) for _, row in qualified.iterrows()]
-    poster_urls = await asyncio.gather(*[fetch_poster_url(mid) for mid in ids])
-
-    results = []
-    for i, (_, movie) in enumerate(qualified.iterrows()):
-        results.append(MovieResponse(
-            id=int(movie['id']),
-            title=movie['title'],
-            overview=movie['overview'] if pd.notna(movie['overview']) else '',
-            poster_url=poster_urls[i],
-            vote_average=float(movie['vote_average']),
-            release_date=str(movie['release_date']),
-            genres=movie['genres_list'] if isinstance(movie['genres_list'], list) else [],
-            runtime=float(movie['runtime']) if pd.notna(movie['runtime']) else 0.0,
-            tagline=str(movie['tagline']) if pd.notna(movie['tagline']) else '',
-            director=str(movie['director_name']) if pd.notna(movie.get('director_name')) else ''
-        ))
-    return results
-
+async def get_movies_by_genre(request: Request,
+                              genre: list[str] = Query(..., min_length=1),
+                              match: str = Query("any", pattern="^(any|all)$"),
+                              offset: int = Query(0, ge=0, le=10000),
+                              limit: int = Query(20, ge=1, le=100),
+                              snap: DatasetSnapshot = Depends(use_snapshot)):
+    """Get movies in any (OR) or all (AND) of the given genres, sorted by rating.
+
+    Genres can be repeated (?genre=Action&genre=Comedy) or comma-separated.
+    """
+    genres = sorted({g.strip().lower() for value in genre for g in value.split(",") if g.strip()})
+    key = ("movies-by-genre", tuple(genres), match, offset, limit)
+    cached = cached_response(request, snap, key)
+    if cached is not None:
+        return cached
+
+    rows, total = snap.genre_index.query(genres, match_all=(match == "all"), offset=offset, limit=limit)
+    if total == 0:
+        raise HTTPException(status_code=404, detail=f"No movies found for genre '{', '.join(genre)}'")
+    body, pending = await render_movies(snap, rows.tolist())
+    return cache_body(request, snap, key, body, headers={"X-Total-Count": str(total)}, pending=pending)
+
+
+@app.get("/search", response_model=list[MovieResponse])
+async def search_movies(q: str = Query(..., min_length=1, max_length=200),
+                        offset: int = Query(0, ge=0, le=1000),
+                        limit: int = Query(20, ge=1, le=100),
+                        snap: DatasetSnapshot = Depends(use_snapshot)):
+    """Free-text search over titles, overviews, genres, keywords, cast and director (BM25).
+
+    X-Total-Count is the number of movies matching any query word.
+    """
+    if snap.search_index is None:
+        raise HTTPException(status_code=503, detail="Search index not built; rebuild the model artifact")
+
+    with STAGE_SECONDS.time(stage="search"):
+        rows, total = await offload("search", snap.search_index.search, q, limit, offset)
+    return json_body(*await render_movies(snap, rows), headers={"X-Total-Count": str(total)})
 
 @app.get("/movies")
-async def get_all_movies():
+async def get_all_movies(snap: DatasetSnapshot = Depends(use_snapshot)):
     """Get list of all available movies for autocomplete"""
-    global movies_data
-    
-    if movies_data is None:
-        raise HTTPException(status_code=503, detail="Data not loaded yet")
-    
-    return {"movies": movies_data['title'].tolist()}
+    return {"movies": snap.movies_data['title'].tolist()}
 
 @app.get("/autocomplete")
-async def autocomplete(q: str = Query(..., min_length=1)):
-    """Get movie suggestions based on partial input with fuzzy matching"""
-    global movies_data
-    
-    if movies_data is None:
+async def autocomplete(q: str = Query(..., min_length=1),
+                       limit: int = Query(10, ge=1, le=AUTOCOMPLETE_MAX_LIMIT),
+                       snap: DatasetSnapshot = Depends(use_snapshot)):
+    """Get movie suggestions: title and word prefixes first, then substrings, then fuzzy matches"""
+    index = snap.autocomplete_index
+    rows = index.indexed_rows(q, limit)
+    if len(rows) < limit and q.strip():
+        # Only the fuzzy tier is slow enough for the compute pool. When the
+        # pool is full, the prefix and substring matches are returned alone
+        try:
+            rows = await offload("autocomplete", index.fuzzy_rows, q, rows, limit)
+        except HTTPException:
+            if not rows:
+                raise
+    return {"suggestions": index.suggestions(rows)}
+
+def require_admin(request: Request):
+    """Reject the request unless it carries the admin token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/admin/ingest")
+async def admin_ingest(request: Request, body: IngestRequest):
+    """Add or correct movies without a restart (see catalog_ingest.py).
+
+    The update is applied to the newest model artifact version under the
+    artifact lock, saved as a new version and swapped into this worker;
+    other workers load it when they next check the artifact
+    (ARTIFACT_WATCH_SECONDS). Malformed records are rejected with 422.
+    """
+    require_admin(request)
+    if snapshot is None:
         raise HTTPException(status_code=503, detail="Data not loaded yet")
-    
-    query = q.strip()
-    
-    if not query:
-        return {"suggestions": []}
-    
-    # Get all movie titles
-    all_titles = movies_data['title'].tolist()
-    
-    # Filter titles that contain the query (case-insensitive)
-    query_lower = query.lower()
-    exact_matches = [title for title in all_titles if query_lower in title.lower()]
-    
-    # If we have enough exact matches, return them
-    if len(exact_matches) >= 10:
-        return {"suggestions": sorted(exact_matches[:10])}
-    
-    # Otherwise, add fuzzy matches
-    fuzzy_matches = process.extract(query, all_titles, scorer=fuzz.token_sort_ratio, limit=15)
-    
-    # Combine exact and fuzzy matches, remove duplicates, and sort by relevance
-    all_matches = exact_matches + [match[0] for match in fuzzy_matches if match[0] not in exact_matches and match[1] >= 60]
-    
-    # Return top 10 suggestions
-    return {"suggestions": all_matches[:10]}
+
+    async with catalog_lock:
+        def update(catalog):
+            return ingest(MODEL_ARTIFACT_DIR, body.movies, catalog,
+                          detail_cache_entries=DETAIL_CACHE_ENTRIES, detail_cache_bytes=DETAIL_CACHE_BYTES)
+        base = snapshot.acquire()
+        try:
+            catalog, summary, path = await asyncio.to_thread(update, base.catalog())
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        finally:
+            base.release()
+        install_catalog(catalog, "ingest")
+    print(f"Ingested {summary['added']} new, {summary['updated']} changed movies; wrote {path}")
+    return summary
+
+@app.post("/admin/reload")
+async def admin_reload(request: Request, source: str = Query("artifact", pattern="^(artifact|csv)$")):
+    """Load the dataset again and swap it in without dropping requests.
+
+    `artifact` reads the current model artifact version (falling back to
+    the CSVs when there is none); `csv` rebuilds from the CSVs.
+    """
+    require_admin(request)
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Data not loaded yet")
+    return await reload_dataset(from_csv=(source == "csv"))
+
+@app.get("/admin/dataset")
+async def admin_dataset(request: Request):
+    """The snapshot this worker serves and replaced ones still finishing requests"""
+    require_admin(request)
+    return {
+        "current": snapshot.info() if snapshot is not None else None,
+        "draining": [s.info() for s in draining_snapshots if not s.closed],
+    }
+
+@app.get("/admin/profiles")
+async def admin_profiles(request: Request):
+    """Stored profiles of this worker, newest first, without their reports"""
+    require_admin(request)
+    return {"profiles": profile_buffer.list()}
+
+@app.get("/admin/profiles/{report_id}")
+async def admin_profile(request: Request, report_id: str):
+    """One stored profile with its report"""
+    require_admin(request)
+    entry = profile_buffer.get(report_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found in this worker")
+    return entry
+
+@app.post("/posters")
+async def get_posters(request: PosterRequest, snap: DatasetSnapshot = Depends(use_snapshot)):
+    """Poster URLs for catalog movies, for filling in posters a response left empty.
+
+    `pending` lists movies whose fetch is still running; poll again for those.
+    """
+    movie_ids = [movie_id for movie_id in dict.fromkeys(request.ids) if movie_id in snap.movie_positions]
+    poster_urls = await resolve_posters(movie_ids)
+    return {
+        "posters": {str(movie_id): url for movie_id, url in zip(movie_ids, poster_urls)},
+        "pending": [movie_id for movie_id, url in zip(movie_ids, poster_urls) if poster_pending(movie_id, url)],
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker (see metrics.py)"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/posters/warmup")
+async def poster_warmup_status():
+    """Progress of the background poster cache warm-up"""
+    if poster_warmer is None:
+        return {"running": False, "enabled": POSTER_WARM,
+                "detail": "Warm-up runs in another worker" if POSTER_WARM else "Warm-up is disabled"}
+    return {"enabled": True, **poster_warmer.progress()}
@@ -0,0 +1,446 @@
+"""Versioned on-disk model artifact, memory-mapped by the API at startup.
+
+Build it offline with:
+
+    python model_artifact.py build [--out model_artifact] [--k 50]
+                                   [--backend exact|ivf] [--check-recall 500]
+                                   [--min-recall 0.9]
+                                   [--workers 8] [--max-memory-mb 2048]
+
+Layout of an artifact directory:
+
+    model_artifact/
+        CURRENT                 name of the active version directory
+        CURRENT.lock            held while a process updates the artifact (artifact_lock)
+        v6-<dataset_version>/
+            manifest.json       format version, dataset version, column schema
+            <column>.npy        numeric columns
+            <column>.data.npy   UTF-8 bytes of a string column (uint8)
+            <column>.offsets.npy  start/end offsets into .data (int64, n+1)
+            <column>.codes.npy  vocabulary codes of a list-of-strings column
+            neighbor_ids.npy / neighbor_scores.npy
+            title_index/        trigram postings of the title index (CSR)
+            details/            /movie/{id} records, read on demand (see detail_store.py)
+            search_index/       BM25 postings for /search (CSC, see search_index.py)
+            tag_vectors/        tag count matrix (CSR) and the frozen vocabulary
+            autocomplete/       prefix table and trigram postings (see autocomplete_index.py)
+            fragments/          pre-encoded MovieResponse JSON (see movie_fragments.py)
+
+Every array is saved with np.save and opened with mmap_mode='r', so several
+gunicorn workers on the same box share one copy in the OS page cache. That
+covers the numeric columns (the DataFrames are built with copy=False), the
+neighbor lists, tag vectors, postings and detail records. String columns
+(titles, overviews, genre lists, ...), vocabularies, autocomplete keys and
+JSON fragments are stored the same way but decoded into Python objects when
+loaded, so each worker holds its own copy: about 15 MB on a 20k-movie
+catalog. The autocomplete index and the fragments are saved prebuilt; the
+genre index, filters and vote counts are still derived in each worker at
+load time (about 50 ms on a 20k-movie catalog, see build_catalog_indexes).
+
+Every build or ingest writes a complete new version directory. After CURRENT
+is moved, all but the newest ARTIFACT_KEEP_VERSIONS (3) versions are
+deleted; the older kept ones give workers that have not reloaded yet a
+grace window.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from autocomplete_index import AutocompleteIndex
+from catalog_build import (NEIGHBOR_K, SIMILARITY_BACKEND, SIMILARITY_OPTIONS, SOURCE_FILES, build_catalog,
+                           build_catalog_indexes)
+from detail_store import MAX_BYTES as DETAIL_CACHE_BYTES, MAX_ENTRIES as DETAIL_CACHE_ENTRIES
+from detail_store import DetailStore, write_details
+from movie_fragments import MovieFragments
+from neighbor_index import NeighborIndex, SIMILARITY_BACKENDS, recall_at_k
+from search_index import SearchIndex
+from title_index import TitleIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: updates are not serialized across processes
+    fcntl = None
+
+ARTIFACT_FORMAT_VERSION = 6
+DEFAULT_ARTIFACT_DIR = "model_artifact"
+# Lowest recall@10 a build checked with --check-recall may have
+MIN_RECALL = float(os.getenv("MIN_RECALL", "0.9"))
+# Files of the autocomplete/ directory (see AutocompleteIndex.to_arrays)
+AUTOCOMPLETE_STRINGS = ("prefix_keys", "short_prefix_keys", "gram_keys")
+AUTOCOMPLETE_ARRAYS = ("rank_to_row", "prefix_rows", "prefix_tiers", "short_prefix_offsets", "short_prefix_rows",
+                       "gram_offsets", "gram_rank_lists")
+# Versions kept after a new one is written; the older ones give workers still serving them a grace window
+KEEP_VERSIONS = int(os.getenv("ARTIFACT_KEEP_VERSIONS", "3"))
+
+# Tables stored in the artifact and the columns kept from each
+TABLES = {
+    "movies": ['id', 'title', 'overview', 'director_name', 'vote_average',
+               'release_date', 'runtime', 'tagline', 'genres_list'],
+    "raw_movies": ['id', 'vote_count', 'vote_average', 'release_date', 'runtime',
+                   'tagline', 'budget', 'revenue', 'status'],
+}
+
+
+def dataset_fingerprint(paths=SOURCE_FILES):
+    """Content hash of the source CSVs, used as the dataset version"""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _write_strings(directory, name, values):
+    _write_blobs(directory, name, [("" if v is None or (isinstance(v, float) and np.isnan(v)) else str(v))
+                                   .encode('utf-8') for v in values])
+
+
+def _write_blobs(directory, name, encoded):
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(directory, f"{name}.data.npy"), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+
+def _read_strings(directory, name):
+    return [blob.decode('utf-8') for blob in _read_blobs(directory, name)]
+
+
+def _read_blobs(directory, name):
+    data = np.load(os.path.join(directory, f"{name}.data.npy"), mmap_mode='r')
+    offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode='r')
+    blob = data.tobytes()
+    bounds = offsets.tolist()
+    return [blob[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+
+def _write_column(directory, name, series):
+    """Write one DataFrame column and return its schema entry"""
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        np.save(os.path.join(directory, f"{name}.npy"), series.to_numpy())
+        return {"kind": "numeric", "dtype": str(series.dtype)}
+
+    sample = next((v for v in series if v is not None), None)
+    if isinstance(sample, list):
+        vocab = sorted({item for items in series for item in items})
+        lookup = {item: code for code, item in enumerate(vocab)}
+        codes = np.array([lookup[item] for items in series for item in items], dtype=np.int32)
+        offsets = np.zeros(len(series) + 1, dtype=np.int64)
+        np.cumsum([len(items) for items in series], out=offsets[1:])
+        np.save(os.path.join(directory, f"{name}.codes.npy"), codes)
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+        return {"kind": "string_list", "vocab": vocab}
+
+    _write_strings(directory, name, series.tolist())
+    return {"kind": "string"}
+
+
+def _read_column(directory, name, schema):
+    if schema["kind"] == "numeric":
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+    if schema["kind"] == "string_list":
+        vocab = schema["vocab"]
+        codes = np.load(os.path.join(directory, f"{name}.codes.npy"), mmap_mode='r').tolist()
+        bounds = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode='r').tolist()
+        return [[vocab[c] for c in codes[bounds[i]:bounds[i + 1]]] for i in range(len(bounds) - 1)]
+    return _read_strings(directory, name)
+
+
+def save_artifact(out_dir, movies_data, neighbor_index, title_index, raw_movies, movie_details,
+                  tag_vectors, tag_vocabulary, dataset_version, similarity=None, search_index=None,
+                  autocomplete_index=None, movie_fragments=None, keep_versions=KEEP_VERSIONS):
+    """Write a new artifact version, atomically point CURRENT at it and prune old versions.
+
+    Callers hold artifact_lock, so a concurrent writer cannot prune the
+    version another one is reading from.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    version_name = f"v{ARTIFACT_FORMAT_VERSION}-{dataset_version}"
+    final_dir = os.path.join(out_dir, version_name)
+    tmp_dir = os.path.join(out_dir, f".tmp-{version_name}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    frames = {
+        "movies": movies_data,
+        "raw_movies": raw_movies,
+    }
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "dataset_version": dataset_version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "n_movies": len(movies_data),
+        "neighbor_k": neighbor_index.k,
+        "similarity": similarity or {},
+        "tables": {},
+    }
+    for table, columns in TABLES.items():
+        table_dir = os.path.join(tmp_dir, table)
+        os.makedirs(table_dir)
+        frame = frames[table].reset_index(drop=True)
+        manifest["tables"][table] = {
+            "rows": len(frame),
+            "columns": {col: _write_column(table_dir, col, frame[col]) for col in columns},
+        }
+
+    np.save(os.path.join(tmp_dir, "neighbor_ids.npy"), np.ascontiguousarray(neighbor_index.ids))
+    np.save(os.path.join(tmp_dir, "neighbor_scores.npy"), np.ascontiguousarray(neighbor_index.scores))
+
+    write_details(os.path.join(tmp_dir, "details"), movie_details.items())
+
+    title_dir = os.path.join(tmp_dir, "title_index")
+    os.makedirs(title_dir)
+    title_arrays = title_index.to_arrays()
+    _write_strings(title_dir, "grams", title_arrays["grams"])
+    np.save(os.path.join(title_dir, "offsets.npy"), title_arrays["offsets"])
+    np.save(os.path.join(title_dir, "postings.npy"), title_arrays["postings"])
+
+    # Kept so catalog_ingest.py can vectorize new movies without refitting
+    tag_dir = os.path.join(tmp_dir, "tag_vectors")
+    os.makedirs(tag_dir)
+    tag_vectors = tag_vectors.tocsr()
+    np.save(os.path.join(tag_dir, "data.npy"), tag_vectors.data.astype(np.int32))
+    np.save(os.path.join(tag_dir, "indices.npy"), tag_vectors.indices.astype(np.int32))
+    np.save(os.path.join(tag_dir, "indptr.npy"), tag_vectors.indptr.astype(np.int32))
+    _write_strings(tag_dir, "vocabulary", tag_vocabulary)
+
+    if search_index is not None:
+        search_dir = os.path.join(tmp_dir, "search_index")
+        os.makedirs(search_dir)
+        search_arrays = search_index.to_arrays()
+        _write_strings(search_dir, "terms", search_arrays["terms"])
+        for name in ("offsets", "docs", "tfs", "doc_lengths"):
+            np.save(os.path.join(search_dir, f"{name}.npy"), np.ascontiguousarray(search_arrays[name]))
+
+    # Saved so workers do not rebuild them from the tables at every load
+    if autocomplete_index is not None:
+        autocomplete_dir = os.path.join(tmp_dir, "autocomplete")
+        os.makedirs(autocomplete_dir)
+        for name, values in autocomplete_index.to_arrays().items():
+            if name in AUTOCOMPLETE_STRINGS:
+                _write_strings(autocomplete_dir, name, values)
+            else:
+                np.save(os.path.join(autocomplete_dir, f"{name}.npy"), np.ascontiguousarray(values))
+    if movie_fragments is not None:
+        fragments_dir = os.path.join(tmp_dir, "fragments")
+        os.makedirs(fragments_dir)
+        for name, values in movie_fragments.to_arrays().items():
+            _write_blobs(fragments_dir, name, values)
+
+    with open(os.path.join(tmp_dir, "manifest.json"), 'w') as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.rename(tmp_dir, final_dir)
+    pointer_tmp = os.path.join(out_dir, f".CURRENT.{os.getpid()}")
+    with open(pointer_tmp, 'w') as f:
+        f.write(version_name)
+    os.replace(pointer_tmp, os.path.join(out_dir, "CURRENT"))
+    prune_versions(out_dir, keep_versions)
+    return final_dir
+
+
+def prune_versions(artifact_dir, keep):
+    """Delete all but the `keep` most recently written version directories (never the current one).
+
+    Workers still serving a deleted version keep working: their memory-mapped
+    files stay readable until they are unmapped.
+    """
+    current = current_artifact_path(artifact_dir)
+    versions = [os.path.join(artifact_dir, name) for name in os.listdir(artifact_dir)
+                if re.fullmatch(r"v\d+-\w+", name) and os.path.isdir(os.path.join(artifact_dir, name))]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for path in versions[max(keep, 1):]:
+        if current is None or not os.path.samefile(path, current):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def current_artifact_path(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """Return the active version directory, or None if no artifact is built"""
+    try:
+        with open(os.path.join(artifact_dir, "CURRENT")) as f:
+            version_dir = os.path.join(artifact_dir, f.read().strip())
+    except FileNotFoundError:
+        return None
+    return version_dir if os.path.isdir(version_dir) else None
+
+
+def artifact_version(path):
+    """Dataset version from an artifact version directory name (v<format>-<dataset_version>)"""
+    return os.path.basename(path).split('-', 1)[-1]
+
+
+@contextmanager
+def artifact_lock(artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """Exclusive lock for read-modify-write updates of the artifact, across processes"""
+    os.makedirs(artifact_dir, exist_ok=True)
+    with open(os.path.join(artifact_dir, "CURRENT.lock"), 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)  # Released when the file is closed
+        yield
+
+
+def load_artifact(artifact_dir=DEFAULT_ARTIFACT_DIR, detail_cache_entries=DETAIL_CACHE_ENTRIES,
+                  detail_cache_bytes=DETAIL_CACHE_BYTES):
+    """Memory-map the active artifact.
+
+    String columns and key lists are decoded into per-worker Python objects
+    (see the module docstring); everything else stays memory-mapped. Returns
+    a dict with the manifest, the movies and raw_movies DataFrames, the
+    DetailStore of per-movie detail records (with an LRU of the given size),
+    the NeighborIndex, the TitleIndex, the tag vectors with their vocabulary,
+    the SearchIndex, the AutocompleteIndex and the MovieFragments, or None
+    when there is no compatible artifact on disk.
+    """
+    version_dir = current_artifact_path(artifact_dir)
+    if version_dir is None:
+        return None
+    with open(os.path.join(version_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        print(f"Ignoring model artifact {version_dir}: format version "
+              f"{manifest.get('format_version')} != {ARTIFACT_FORMAT_VERSION}")
+        return None
+
+    frames = {}
+    for table, spec in manifest["tables"].items():
+        table_dir = os.path.join(version_dir, table)
+        # copy=False keeps numeric columns as views of the memory-mapped files
+        frames[table] = pd.DataFrame({
+            col: _read_column(table_dir, col, schema) for col, schema in spec["columns"].items()
+        }, copy=False)
+
+    neighbor_index = NeighborIndex(
+        np.load(os.path.join(version_dir, "neighbor_ids.npy"), mmap_mode='r'),
+        np.load(os.path.join(version_dir, "neighbor_scores.npy"), mmap_mode='r'),
+    )
+    title_dir = os.path.join(version_dir, "title_index")
+    title_index = TitleIndex(
+        frames["movies"]["title"].tolist(),
+        grams=_read_strings(title_dir, "grams"),
+        offsets=np.load(os.path.join(title_dir, "offsets.npy"), mmap_mode='r'),
+        postings=np.load(os.path.join(title_dir, "postings.npy"), mmap_mode='r'),
+    )
+    tag_dir = os.path.join(version_dir, "tag_vectors")
+    tag_vocabulary = _read_strings(tag_dir, "vocabulary")
+    tag_vectors = sp.csr_matrix(
+        (np.load(os.path.join(tag_dir, "data.npy"), mmap_mode='r'),
+         np.load(os.path.join(tag_dir, "indices.npy"), mmap_mode='r'),
+         np.load(os.path.join(tag_dir, "indptr.npy"), mmap_mode='r')),
+        shape=(len(frames["movies"]), len(tag_vocabulary)),
+    )
+    search_dir = os.path.join(version_dir, "search_index")
+    search_index = SearchIndex(
+        _read_strings(search_dir, "terms"),
+        *[np.load(os.path.join(search_dir, f"{name}.npy"), mmap_mode='r')
+          for name in ("offsets", "docs", "tfs", "doc_lengths")],
+    ) if os.path.isdir(search_dir) else None
+
+    autocomplete_dir = os.path.join(version_dir, "autocomplete")
+    autocomplete_index = AutocompleteIndex.from_arrays(title_index, {
+        **{name: _read_strings(autocomplete_dir, name) for name in AUTOCOMPLETE_STRINGS},
+        **{name: np.load(os.path.join(autocomplete_dir, f"{name}.npy"), mmap_mode='r') for name in AUTOCOMPLETE_ARRAYS},
+    }) if os.path.isdir(autocomplete_dir) else None
+    fragments_dir = os.path.join(version_dir, "fragments")
+    movie_fragments = MovieFragments.from_arrays(
+        frames["movies"], _read_blobs(fragments_dir, "heads"), _read_blobs(fragments_dir, "tails"),
+    ) if os.path.isdir(fragments_dir) else None
+    return {
+        "manifest": manifest,
+        "path": version_dir,
+        "movies_data": frames["movies"],
+        "raw_movies": frames["raw_movies"],
+        "movie_details": DetailStore(os.path.join(version_dir, "details"), detail_cache_entries,
+                                     detail_cache_bytes),
+        "neighbor_index": neighbor_index,
+        "title_index": title_index,
+        "tag_vectors": tag_vectors,
+        "tag_vocabulary": tag_vocabulary,
+        "search_index": search_index,
+        "autocomplete_index": autocomplete_index,
+        "movie_fragments": movie_fragments,
+    }
+
+
+def build(out_dir=DEFAULT_ARTIFACT_DIR, k=None, backend=None, check_recall=0,
+          workers=None, max_memory_mb=None, min_recall=MIN_RECALL):
+    """Run the full CSV pipeline once and persist the result.
+
+    With check_recall > 0, recall@10 of the built index against exact
+    neighbors is measured on that many sampled movies and stored in the
+    manifest; below min_recall a ValueError is raised and nothing is saved. The exact backend runs on `workers` processes (default: every
+    CPU) with dense similarity blocks kept under max_memory_mb, and streams
+    neighbor lists to a scratch directory instead of holding them in memory.
+    """
+    backend = backend or SIMILARITY_BACKEND
+    options = dict(SIMILARITY_OPTIONS.get(backend, {}))
+    if backend == "exact":
+        options["workers"] = workers or int(os.getenv("BUILD_WORKERS", "0")) or os.cpu_count() or 1
+        if max_memory_mb is not None:
+            options["max_memory_mb"] = max_memory_mb
+    scratch_dir = os.path.join(out_dir, f".scratch-{os.getpid()}")
+
+    try:
+        start = time.perf_counter()
+        catalog, _ = build_catalog(neighbor_k=k or NEIGHBOR_K, backend=backend,
+                                   similarity_options=dict(options, out_dir=scratch_dir) if backend == "exact"
+                                   else options)
+        build_seconds = time.perf_counter() - start
+        similarity = {
+            "backend": backend,
+            "options": options,
+            "build_seconds": round(build_seconds, 2),
+        }
+        if check_recall > 0:
+            recall = recall_at_k(catalog['tag_vectors'], catalog['neighbor_index'], k=10, sample_size=check_recall)
+            similarity["recall_at_10"] = round(recall, 4)
+            print(f"Recall@10 vs exact ({check_recall} movies sampled): {recall:.4f}")
+            if recall < min_recall:
+                raise ValueError(f"Recall@10 {recall:.4f} is below the minimum {min_recall}; "
+                                 f"raise IVF_PROBES or IVF_TARGET_RECALL, or use the exact backend")
+        build_catalog_indexes(catalog)
+        with artifact_lock(out_dir):
+            path = save_artifact(out_dir, catalog['movies_data'], catalog['neighbor_index'], catalog['title_index'],
+                                 catalog['raw_movies'], catalog['movie_details'],
+                                 catalog['tag_vectors'], catalog['tag_vocabulary'],
+                                 dataset_fingerprint(), similarity, catalog['search_index'],
+                                 catalog['autocomplete_index'], catalog['movie_fragments'])
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    print(f"Wrote model artifact {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the versioned model artifact")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="process the TMDB CSVs and write a new artifact version")
+    build_cmd.add_argument("--out", default=os.getenv("MODEL_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR))
+    build_cmd.add_argument("--k", type=int, default=None, help="neighbors kept per movie")
+    build_cmd.add_argument("--backend", choices=sorted(SIMILARITY_BACKENDS), default=None,
+                           help="similarity backend (default: SIMILARITY_BACKEND or exact)")
+    build_cmd.add_argument("--check-recall", type=int, default=0, metavar="N",
+                           help="measure recall@10 against exact neighbors on N sampled movies")
+    build_cmd.add_argument("--min-recall", type=float, default=MIN_RECALL,
+                           help=f"with --check-recall, fail the build below this recall@10 (default {MIN_RECALL})")
+    build_cmd.add_argument("--workers", type=int, default=None,
+                           help="processes for the exact backend (default: BUILD_WORKERS or every CPU)")
+    build_cmd.add_argument("--max-memory-mb", type=int, default=None,
+                           help="memory budget for dense similarity blocks across all workers")
+    args = parser.parse_args()
+    if args.command == "build":
+        try:
+            build(args.out, args.k, args.backend, args.check_recall, args.workers, args.max_memory_mb,
+                  args.min_recall)
+        except ValueError as e:
+            parser.error(str(e))
@@ -0,0 +1,105 @@
+"""Filtered and paged /recommend over columnar movie attributes, built once per catalog.
+
+Release year, rating, vote count, runtime and genre membership are kept as
+numpy arrays, so a filter is a few vectorized comparisons over the catalog.
+Candidates are taken in similarity order: first the precomputed neighbor
+list, and only when it has fewer than offset + k matches, the cosine scores
+against every movie, of which only the best matches are selected
+(argpartition) and sorted.
+"""
+import numpy as np
+import pandas as pd
+
+
+class MovieFilters:
+    def __init__(self, movies, vote_counts, tag_vectors):
+        years = pd.to_numeric(movies['release_date'].astype(str).str[:4], errors='coerce')
+        self.year = years.fillna(0).to_numpy(dtype=np.int16)  # 0 when unknown
+        self.vote_average = movies['vote_average'].fillna(0).to_numpy(dtype=np.float32)
+        self.vote_count = np.asarray(vote_counts, dtype=np.int64)
+        self.runtime = movies['runtime'].fillna(0).to_numpy(dtype=np.float32)  # 0 when unknown
+
+        rows_by_genre = {}
+        for row, genres in enumerate(movies['genres_list']):
+            for genre in genres if isinstance(genres, list) else []:
+                rows_by_genre.setdefault(genre.lower(), []).append(row)
+        self.genres = {}  # lowercase name -> bool mask over rows
+        for genre, rows in rows_by_genre.items():
+            mask = np.zeros(len(movies), dtype=bool)
+            mask[rows] = True
+            self.genres[genre] = mask
+
+        # For scoring past the precomputed neighbor lists
+        self.tag_vectors = tag_vectors
+        self.tag_norms = np.sqrt(np.asarray(tag_vectors.multiply(tag_vectors).sum(axis=1), dtype=np.float32).ravel())
+
+    def mask(self, genres=(), match_all=False, year_min=None, year_max=None, min_rating=None,
+             min_votes=None, runtime_min=None, runtime_max=None):
+        """Rows passing every given filter, or None when no filter is given.
+
+        Unknown years and runtimes fail year and runtime filters.
+        """
+        mask = None
+
+        def narrow(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        if genres:
+            lists = [self.genres.get(g.strip().lower()) for g in genres]
+            known = [m for m in lists if m is not None]
+            if not known or (match_all and len(known) < len(lists)):
+                return np.zeros(len(self.year), dtype=bool)
+            combined = known[0]
+            for other in known[1:]:
+                combined = combined & other if match_all else combined | other
+            narrow(combined)
+        if year_min is not None or year_max is not None:
+            narrow(self.year > 0)
+            if year_min is not None:
+                narrow(self.year >= year_min)
+            if year_max is not None:
+                narrow(self.year <= year_max)
+        if min_rating is not None:
+            narrow(self.vote_average >= min_rating)
+        if min_votes is not None:
+            narrow(self.vote_count >= min_votes)
+        if runtime_min is not None or runtime_max is not None:
+            narrow(self.runtime > 0)
+            if runtime_min is not None:
+                narrow(self.runtime >= runtime_min)
+            if runtime_max is not None:
+                narrow(self.runtime <= runtime_max)
+        return mask
+
+    def scores(self, row):
+        """Cosine similarity of a movie to every movie"""
+        query = self.tag_vectors[row].toarray().ravel().astype(np.float32)
+        norms = self.tag_norms * (self.tag_norms[row] or 1.0)
+        return np.divide(self.tag_vectors @ query, norms, out=np.zeros(len(norms), dtype=np.float32),
+                         where=norms > 0)
+
+    def recommend(self, neighbor_index, row, k=5, offset=0, filters=None):
+        """Rows of the movies most similar to row that pass the filters (mask() arguments), from offset on"""
+        need = offset + k
+        mask = self.mask(**(filters or {}))
+        listed = neighbor_index.ids[row]
+        listed = listed[listed >= 0]
+        hits = listed if mask is None else listed[mask[listed]]
+        if len(hits) >= need:
+            return hits[offset:need].tolist()
+
+        # The neighbor list ran out: rank everything after it by score, keeping only matches
+        scores = self.scores(row)
+        allowed = scores > 0
+        if mask is not None:
+            allowed &= mask
+        allowed[row] = False
+        allowed[listed] = False
+        candidates = np.flatnonzero(allowed)
+        more = need - len(hits)
+        if len(candidates) > more:
+            candidates = candidates[np.argpartition(-scores[candidates], more - 1)[:more]]
+        # Best first; ties go to the lower row
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return np.concatenate([hits, candidates])[offset:need].tolist()
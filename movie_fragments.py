@@ -0,0 +1,68 @@
+"""Pre-encoded MovieResponse JSON for the list endpoints, built once at load time"""
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def dumps(value):
+    """Compact UTF-8 JSON, the encoding every fragment uses"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class MovieFragments:
+    """Every movie's MovieResponse JSON, encoded once.
+
+    A row is stored as the bytes before and after its poster_url value, the
+    only field that changes between requests, so a response list is a join
+    of byte strings instead of DataFrame row lookups, pydantic models and a
+    second serialization pass. Field order and values match MovieResponse.
+    """
+
+    def __init__(self, movies_data):
+        self.ids = movies_data['id'].to_numpy(dtype=np.int64)
+        self.titles = [str(t) if pd.notna(t) else '' for t in movies_data['title'].tolist()]
+        self.heads = []
+        self.tails = []
+        for movie_id, title, overview, vote_average, release_date, genres, runtime, tagline, director in zip(
+                self.ids.tolist(), self.titles, movies_data['overview'].tolist(),
+                movies_data['vote_average'].tolist(), movies_data['release_date'].tolist(),
+                movies_data['genres_list'].tolist(), movies_data['runtime'].tolist(),
+                movies_data['tagline'].tolist(), movies_data['director_name'].tolist()):
+            self.heads.append(
+                f'{{"id":{movie_id},"title":{dumps(title)},'
+                f'"overview":{dumps(overview if pd.notna(overview) else "")},"poster_url":'.encode()
+            )
+            self.tails.append((
+                f',"vote_average":{dumps(float(vote_average))},'
+                f'"release_date":{dumps(str(release_date))},'
+                f'"genres":{dumps(genres if isinstance(genres, list) else [])},'
+                f'"runtime":{dumps(float(runtime) if pd.notna(runtime) else 0.0)},'
+                f'"tagline":{dumps(str(tagline) if pd.notna(tagline) else "")},'
+                f'"director":{dumps(str(director) if pd.notna(director) else "")}}}'
+            ).encode())
+
+    @classmethod
+    def from_arrays(cls, movies_data, heads, tails):
+        """Fragments encoded earlier (see to_arrays), e.g. read back from the model artifact"""
+        fragments = cls.__new__(cls)
+        fragments.ids = movies_data['id'].to_numpy(dtype=np.int64)
+        fragments.titles = [str(t) if pd.notna(t) else '' for t in movies_data['title'].tolist()]
+        fragments.heads = heads
+        fragments.tails = tails
+        return fragments
+
+    def to_arrays(self):
+        """The encoded byte strings, the form from_arrays reads back"""
+        return {"heads": self.heads, "tails": self.tails}
+
+    def __len__(self):
+        return len(self.heads)
+
+    def item(self, row, poster_url):
+        """One MovieResponse object as JSON bytes"""
+        return self.heads[row] + dumps(poster_url).encode() + self.tails[row]
+
+    def render(self, rows, poster_urls):
+        """A JSON list of MovieResponse objects for the given rows"""
+        return b'[' + b','.join(self.item(row, url) for row, url in zip(rows, poster_urls)) + b']'
@@ -0,0 +1,342 @@
+"""Compact top-K neighbor index used by the recommender.
+
+Neighbor lists are computed offline by a similarity backend and served as
+plain array slices. Backends:
+
+    exact   blocked brute-force cosine similarity, O(N^2) work, exact results;
+            blocks can run on a process pool and stream to .npy files on disk
+    ivf     k-means partition of the L2-normalized tag vectors; each movie is
+            scored only against the n_probe nearest partitions, so build time
+            grows with N x n_probe x N / n_lists instead of N^2; n_probe is
+            picked for a target recall unless given
+
+Use recall_at_k() to measure an approximate index against exact neighbors.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+DEFAULT_K = 50
+DEFAULT_BLOCK_SIZE = 512
+
+IVF_TARGET_RECALL = 0.95  # Recall@10 the approximate backend picks its n_probe for
+IVF_SAMPLE_SIZE = 500  # Movies sampled to estimate that recall
+
+
+class NeighborIndex:
+    """Top-K most similar movies per movie, kept in two contiguous arrays.
+
+    Row i of ``ids`` holds the row positions of the K nearest movies to movie i
+    (most similar first) and row i of ``scores`` the matching cosine scores.
+    Rows with fewer than K neighbors are padded with -1 ids.
+    """
+
+    def __init__(self, ids, scores):
+        self.ids = ids  # (n_movies, k) int32
+        self.scores = scores  # (n_movies, k) float32
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.scores.nbytes
+
+    def neighbors(self, row, n=5):
+        """Return up to n neighbor row positions for a movie, most similar first"""
+        ids = self.ids[row, :n]
+        return ids[ids >= 0]
+
+    def neighbors_batch(self, rows, n=5):
+        """Gather the first n neighbors of many movies at once; -1 marks padding"""
+        return self.ids[np.asarray(rows, dtype=np.intp), :n]
+
+
+def normalize_vectors(vectors):
+    """L2-normalize rows so a dot product is the cosine similarity"""
+    return normalize(vectors.astype(np.float32), norm='l2', axis=1, copy=True).tocsr()
+
+
+def exact_block_topk(normed, normed_t, start, stop, k):
+    """Exact top-k neighbors for rows [start, stop) as (ids, scores)"""
+    return exact_rows_topk(normed, normed_t, np.arange(start, stop), k, normed[start:stop])
+
+
+def exact_rows_topk(normed, normed_t, rows, k, row_vectors=None):
+    """Exact top-k neighbors for the given rows as (ids, scores)"""
+    if row_vectors is None:
+        row_vectors = normed[rows]
+    block = (row_vectors @ normed_t).toarray()
+    # A movie is never its own recommendation
+    block[np.arange(len(rows)), rows] = -np.inf
+
+    np.negative(block, out=block)  # Smallest first for argpartition, without a second slab
+    top = np.argpartition(block, k - 1, axis=1)[:, :k]
+    top_scores = -np.take_along_axis(block, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return (np.take_along_axis(top, order, axis=1).astype(np.int32),
+            np.take_along_axis(top_scores, order, axis=1).astype(np.float32))
+
+
+_worker_state = {}  # normed / normed_t inside build worker processes
+
+
+def _init_worker(normed):
+    _worker_state["normed"] = normed
+    _worker_state["normed_t"] = normed.T.tocsc()
+
+
+def _worker_block(start, stop, k):
+    return start, *exact_block_topk(_worker_state["normed"], _worker_state["normed_t"], start, stop, k)
+
+
+def block_size_for_memory(n, workers, max_memory_mb):
+    """Rows per block so all workers' dense slabs fit in max_memory_mb.
+
+    A block of b rows peaks at about b x n x 16 bytes: the float32 slab (4
+    per entry) plus, at different times, the sparse product it is densified
+    from (up to 12 per entry with int64 indices) or argpartition's int64
+    indices (8 per entry). The slab is negated in place, so there is no copy.
+    """
+    per_row = 16 * max(n, 1)
+    return max(1, int(max_memory_mb * 1024 * 1024 // (per_row * max(workers, 1))))
+
+
+def build_exact(normed, k, block_size=None, workers=1, max_memory_mb=1024, out_dir=None):
+    """Cosine similarity one block of rows at a time.
+
+    Only a block x n_movies slab is ever dense; each slab is reduced to its
+    top-K with argpartition before the next one is computed. Unless
+    block_size is given, it is derived from max_memory_mb. With workers > 1
+    blocks are spread over a process pool. With out_dir, results are streamed
+    into .npy memmaps there instead of being held in memory.
+    """
+    n = normed.shape[0]
+    if block_size is None:
+        block_size = min(block_size_for_memory(n, workers, max_memory_mb), n)
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        ids = np.lib.format.open_memmap(os.path.join(out_dir, "neighbor_ids.npy"), mode='w+',
+                                        dtype=np.int32, shape=(n, k))
+        scores = np.lib.format.open_memmap(os.path.join(out_dir, "neighbor_scores.npy"), mode='w+',
+                                           dtype=np.float32, shape=(n, k))
+    else:
+        ids = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float32)
+    blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+
+    if workers <= 1:
+        normed_t = normed.T.tocsc()
+        for start, stop in blocks:
+            ids[start:stop], scores[start:stop] = exact_block_topk(normed, normed_t, start, stop, k)
+    else:
+        # Spawned, not forked: a reload builds this from a thread of the running server
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(normed,)) as pool:
+            futures = [pool.submit(_worker_block, start, stop, k) for start, stop in blocks]
+            for done, future in enumerate(as_completed(futures), 1):
+                start, block_ids, block_scores = future.result()
+                ids[start:start + len(block_ids)] = block_ids
+                scores[start:start + len(block_ids)] = block_scores
+                if done % 50 == 0 or done == len(blocks):
+                    print(f"  neighbor blocks: {done}/{len(blocks)}")
+
+    if out_dir is not None:
+        ids.flush()
+        scores.flush()
+    return ids, scores
+
+
+def build_ivf(normed, k, n_lists=None, n_probe=None, target_recall=IVF_TARGET_RECALL,
+              block_size=DEFAULT_BLOCK_SIZE, seed=0):
+    """Approximate top-K with an inverted-file (IVF) partition of the catalog.
+
+    Spherical k-means splits the L2-normalized vectors into n_lists clusters
+    (default sqrt(N)). Movies are then scored, with the exact cosine, only
+    against the members of the n_probe clusters whose centroids are closest
+    to their own cluster's centroid. Returned scores are exact and only
+    recall is approximate. Recall and build time both grow with
+    n_probe / n_lists. Without an explicit n_probe, the smallest one whose
+    recall@10 on a sample of movies reaches target_recall is used (see
+    choose_n_probe).
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    n = normed.shape[0]
+    if n_lists is None:
+        n_lists = int(round(np.sqrt(n)))
+    n_lists = max(1, min(n_lists, n))
+
+    kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3,
+                             batch_size=max(1024, 8 * n_lists))
+    kmeans.fit(normed)
+    centroids = normalize(kmeans.cluster_centers_.astype(np.float32))
+
+    assign = np.empty(n, dtype=np.int32)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        assign[start:stop] = np.asarray(normed[start:stop] @ centroids.T).argmax(axis=1)
+    # Each list is always probed first, then its nearest neighboring lists
+    centroid_sims = centroids @ centroids.T
+    np.fill_diagonal(centroid_sims, np.inf)
+    probe_order = np.argsort(-centroid_sims, axis=1)
+    if n_probe is None:
+        # Sampled apart from recall_at_k's default seed, so --check-recall stays an independent check
+        n_probe, recall = choose_n_probe(normed, assign, probe_order, min(k, 10), target_recall, seed=seed + 1)
+        print(f"IVF: n_probe {n_probe} of {n_lists} lists, sampled recall@10 {recall:.3f} "
+              f"(target {target_recall})")
+    n_probe = max(1, min(n_probe, n_lists))
+    probes = probe_order[:, :n_probe]
+
+    order = np.argsort(assign, kind='stable').astype(np.int32)
+    bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+    members = [order[bounds[c]:bounds[c + 1]] for c in range(n_lists)]
+
+    ids = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    for c in range(n_lists):
+        if len(members[c]) == 0:
+            continue
+        candidates = np.sort(np.concatenate([members[p] for p in probes[c]]))
+        candidates_t = normed[candidates].T.tocsc()
+        kk = min(k, len(candidates) - 1)
+        if kk <= 0:
+            continue
+        for start in range(0, len(members[c]), block_size):
+            rows = members[c][start:start + block_size]
+            block = (normed[rows] @ candidates_t).toarray()
+            block[np.arange(len(rows)), np.searchsorted(candidates, rows)] = -np.inf
+
+            top = np.argpartition(-block, kk - 1, axis=1)[:, :kk]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            top_order = np.argsort(-top_scores, axis=1, kind='stable')
+            ids[rows, :kk] = candidates[np.take_along_axis(top, top_order, axis=1)]
+            scores[rows, :kk] = np.take_along_axis(top_scores, top_order, axis=1)
+    return ids, scores
+
+
+def choose_n_probe(normed, assign, probe_order, k, target_recall, sample_size=IVF_SAMPLE_SIZE, seed=0):
+    """Smallest n_probe whose estimated recall@k reaches target_recall.
+
+    For a sample of movies the exact top-k is computed once. A true neighbor
+    is found with n_probe lists exactly when its list is among the first
+    n_probe probed for the movie's own list, so the recall of every n_probe
+    follows from the probe rank of each true neighbor's list. Returns
+    (n_probe, estimated recall); n_probe is n_lists when the target cannot
+    be reached with fewer.
+    """
+    n, n_lists = normed.shape[0], probe_order.shape[0]
+    if k <= 0 or n < 2:
+        return 1, 1.0
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+    probe_rank = np.empty_like(probe_order)
+    probe_rank[np.arange(n_lists)[:, None], probe_order] = np.arange(n_lists)
+    normed_t = normed.T.tocsc()
+
+    # found[p] counts true neighbors in the list probed p-th, capped at k per movie below
+    found = np.zeros((len(sample), n_lists), dtype=np.int32)
+    for start in range(0, len(sample), DEFAULT_BLOCK_SIZE):
+        rows = sample[start:start + DEFAULT_BLOCK_SIZE]
+        block = (normed[rows] @ normed_t).toarray()
+        block[np.arange(len(rows)), rows] = -np.inf
+        # Ties at the k-th score count as true neighbors, as in recall_at_k
+        kth = -np.partition(-block, k - 1, axis=1)[:, k - 1]
+        for i, row in enumerate(rows.tolist()):
+            true = np.flatnonzero(block[i] >= kth[i] - 1e-6)
+            ranks = probe_rank[assign[row], assign[true]]
+            found[start + i] = np.bincount(ranks, minlength=n_lists)
+    recall = np.minimum(np.cumsum(found, axis=1), k).mean(axis=0) / k
+    reached = np.flatnonzero(recall >= target_recall)
+    n_probe = int(reached[0]) + 1 if len(reached) else n_lists
+    return n_probe, float(recall[n_probe - 1])
+
+
+def patch_neighbor_index(index, normed, rows, block_size=DEFAULT_BLOCK_SIZE):
+    """Neighbor lists after the vectors of `rows` were changed or appended.
+
+    normed holds every L2-normalized vector after the change; rows at or
+    past len(index) are new movies. The delta rows, and the lists that
+    pointed at a changed movie (their score is stale), are recomputed
+    exactly. Every other list only merges in delta movies that beat its
+    current last neighbor. Returns a new NeighborIndex; index is untouched.
+    """
+    n, k, old_n = normed.shape[0], index.k, len(index)
+    ids = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    ids[:old_n] = index.ids
+    scores[:old_n] = index.scores
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    if k == 0 or len(rows) == 0:
+        return NeighborIndex(ids, scores)
+
+    normed_t = normed.T.tocsc()
+    stale = np.flatnonzero(np.isin(ids[:old_n], rows[rows < old_n]).any(axis=1))
+    recompute = np.union1d(rows, stale)
+    for start in range(0, len(recompute), block_size):
+        block_rows = recompute[start:start + block_size]
+        ids[block_rows], scores[block_rows] = exact_rows_topk(normed, normed_t, block_rows, k)
+
+    merge_scores = np.where(ids >= 0, scores, -np.inf)
+    others = np.setdiff1d(np.arange(n), recompute)
+    for start in range(0, len(rows), block_size):
+        delta = rows[start:start + block_size]
+        sims = (normed[delta] @ normed_t).toarray()[:, others].T  # (others, delta)
+        gains = (sims > merge_scores[others, -1][:, None]).any(axis=1)
+        targets, sims = others[gains], sims[gains]
+        if len(targets) == 0:
+            continue
+        cand_ids = np.concatenate([ids[targets], np.broadcast_to(delta, sims.shape)], axis=1)
+        cand_scores = np.concatenate([merge_scores[targets], sims], axis=1)
+        order = np.argsort(-cand_scores, axis=1, kind='stable')[:, :k]
+        ids[targets] = np.take_along_axis(cand_ids, order, axis=1)
+        merge_scores[targets] = np.take_along_axis(cand_scores, order, axis=1)
+    scores = np.where(ids >= 0, merge_scores, 0.0).astype(np.float32)
+    return NeighborIndex(ids, scores)
+
+
+SIMILARITY_BACKENDS = {
+    "exact": build_exact,
+    "ivf": build_ivf,
+}
+
+
+def build_neighbor_index(vectors, k=DEFAULT_K, backend="exact", **options):
+    """Build a NeighborIndex from a sparse tag/count matrix with the chosen backend"""
+    if backend not in SIMILARITY_BACKENDS:
+        raise ValueError(f"Unknown similarity backend '{backend}', expected one of {sorted(SIMILARITY_BACKENDS)}")
+    n = vectors.shape[0]
+    k = max(0, min(k, n - 1))
+    if k == 0:
+        return NeighborIndex(np.full((n, 0), -1, dtype=np.int32), np.zeros((n, 0), dtype=np.float32))
+    ids, scores = SIMILARITY_BACKENDS[backend](normalize_vectors(vectors), k, **options)
+    return NeighborIndex(ids, scores)
+
+
+def recall_at_k(vectors, index, k=10, sample_size=500, seed=0):
+    """Share of the exact top-k neighbors an index returns, over a sample of movies"""
+    normed = normalize_vectors(vectors)
+    n = normed.shape[0]
+    k = min(k, index.k, n - 1)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+    normed_t = normed.T.tocsc()
+
+    hits = 0
+    for start in range(0, len(sample), DEFAULT_BLOCK_SIZE):
+        rows = sample[start:start + DEFAULT_BLOCK_SIZE]
+        block = (normed[rows] @ normed_t).toarray()
+        block[np.arange(len(rows)), rows] = -np.inf
+        # Count ties at the k-th score as hits so equal-score swaps are not misses
+        kth = -np.partition(-block, k - 1, axis=1)[:, k - 1]
+        approx = index.ids[rows, :k]
+        approx_scores = np.where(approx >= 0, block[np.arange(len(rows))[:, None], np.maximum(approx, 0)], -np.inf)
+        hits += int((approx_scores >= kth[:, None] - 1e-6).sum())
+    return hits / (len(sample) * k)
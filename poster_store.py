@@ -0,0 +1,192 @@
+"""Persistent poster URL cache with write-behind flushing and negative caching.
+
+Entries live in memory for lookups and in a SQLite database (WAL mode) that
+every gunicorn worker on the box shares. New results are buffered and written
+by a background task in one transaction per flush, off the event loop. The
+same task pulls in rows written by other workers since the last flush.
+Every write stamps the row with the next value of a table-wide sequence
+(`seq`), assigned inside the write transaction, so a worker syncs on
+`seq > last seen` and cannot skip a row another worker flushed late.
+
+A lookup returns one of three things:
+    "https://..."  a poster URL that is still fresh
+    ""             a recorded miss/failure whose retry time has not come yet
+    None           nothing usable, so the caller should fetch from TMDB
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+POSITIVE_TTL = 30 * 24 * 3600  # Re-check found posters after 30 days
+MISS_TTL = 24 * 3600  # TMDB answered but has no poster
+FAILURE_TTL = 5 * 60  # Timeout, HTTP error or network failure
+MAX_BACKOFF = 7 * 24 * 3600  # Cap for repeated misses/failures
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posters (
+    movie_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0
+)
+"""
+_UPSERT = """
+INSERT INTO posters (movie_id, url, expires_at, failures, updated_at, seq)
+VALUES (?, ?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM posters))
+ON CONFLICT(movie_id) DO UPDATE SET
+    url = CASE WHEN excluded.url = '' THEN posters.url ELSE excluded.url END,
+    expires_at = excluded.expires_at,
+    failures = excluded.failures,
+    updated_at = excluded.updated_at,
+    seq = excluded.seq
+"""
+
+
+class PosterStore:
+    def __init__(self, path, flush_interval=2.0, legacy_json=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.legacy_json = legacy_json
+        self.entries = {}  # movie_id -> (url, expires_at, failures)
+        self.pending = {}  # movie_id -> row waiting to be written
+        self.version = 0  # Bumped whenever a lookup result could change
+        self._last_sync = 0  # Highest seq read from the database
+        self._flush_task = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def open(self):
+        """Create the table, import the old JSON cache once and load every row"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(_SCHEMA)
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(posters)")]
+                if 'seq' not in columns:  # Database from before seq
+                    conn.execute("ALTER TABLE posters ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+                conn.execute("CREATE INDEX IF NOT EXISTS posters_seq ON posters (seq)")
+            empty = conn.execute("SELECT COUNT(*) FROM posters").fetchone()[0] == 0
+            if empty and self.legacy_json and os.path.exists(self.legacy_json):
+                try:
+                    with open(self.legacy_json) as f:
+                        legacy = json.load(f)
+                    now = time.time()
+                    with conn:
+                        conn.executemany(_UPSERT, [
+                            (int(k), v, now + POSITIVE_TTL, 0, now) for k, v in legacy.items() if v
+                        ])
+                except Exception as e:
+                    print(f"Could not import {self.legacy_json}: {e}")
+        finally:
+            conn.close()
+        self._apply(self._read_since(-1))
+
+    def _read_since(self, since):
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT movie_id, url, expires_at, failures, seq FROM posters WHERE seq > ?",
+                (since,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def _apply(self, rows):
+        changed = False
+        for movie_id, url, expires_at, failures, seq in rows:
+            if movie_id not in self.pending:
+                previous = self.entries.get(movie_id)
+                changed = changed or previous is None or previous[0] != url
+                self.entries[movie_id] = (url, expires_at, failures)
+            self._last_sync = max(self._last_sync, seq)
+        if changed:
+            self.version += 1
+
+    def __len__(self):
+        return sum(1 for url, _, _ in self.entries.values() if url)
+
+    def get(self, movie_id):
+        entry = self.entries.get(movie_id)
+        if entry is None:
+            return None
+        url, expires_at, failures = entry
+        if time.time() < expires_at:
+            return url
+        return None
+
+    def cached_url(self, movie_id):
+        """Any known poster URL for the movie, even if it is due for a re-check"""
+        entry = self.entries.get(movie_id)
+        return entry[0] if entry else ""
+
+    def put(self, movie_id, url):
+        now = time.time()
+        self._set(movie_id, url, now + POSITIVE_TTL, 0, now)
+
+    def put_miss(self, movie_id, failure=False):
+        """Record a miss; retries back off exponentially up to MAX_BACKOFF.
+
+        An already known URL is kept, so a temporary TMDB outage does not
+        blank out posters that were found before.
+        """
+        now = time.time()
+        url, _, failures = self.entries.get(movie_id, ("", 0.0, 0))
+        base = FAILURE_TTL if failure else MISS_TTL
+        ttl = min(base * (2 ** failures), MAX_BACKOFF)
+        self._set(movie_id, url, now + ttl, failures + 1, now)
+
+    def _set(self, movie_id, url, expires_at, failures, now):
+        previous = self.entries.get(movie_id)
+        self.entries[movie_id] = (url, expires_at, failures)
+        self.pending[movie_id] = (movie_id, url, expires_at, failures, now)
+        if previous is None or previous[0] != url:
+            self.version += 1
+
+    def _write(self, rows):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(_UPSERT, rows)
+        finally:
+            conn.close()
+
+    async def flush(self):
+        """Write buffered entries and pick up rows other workers wrote"""
+        if self.pending:
+            rows, self.pending = list(self.pending.values()), {}
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                print(f"Poster cache flush failed: {e}")
+                for row in rows:
+                    self.pending.setdefault(row[0], row)
+                return
+        self._apply(await asyncio.to_thread(self._read_since, self._last_sync))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Poster cache sync failed: {e}")
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self.pending:
+            rows, self.pending = list(self.pending.values()), {}
+            await asyncio.to_thread(self._write, rows)
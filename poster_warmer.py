@@ -0,0 +1,168 @@
+"""Background poster cache warming, so user-facing endpoints rarely pay for a miss.
+
+The API starts one warmer per box after startup (the gunicorn worker that
+wins a file lock runs it). It walks movies in the order users are most
+likely to see them: /top-movies, the most-voted movies, the first page of
+every genre, then the rest by vote count. Fetches go through
+main.fetch_poster_url, so they share the single-flight map and the SQLite
+poster store with request traffic, under a rate limit and a concurrency cap.
+
+Pre-fill the cache before a deploy with:
+
+    python poster_warmer.py [--limit 5000] [--concurrency 4] [--rate 5]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker warms on its own
+    fcntl = None
+
+TOP_MOVIES = 20  # Same selection as /top-movies
+MOST_VOTED = 200
+GENRE_PAGE = 20  # First page of /movies-by-genre
+
+
+def warm_order(movies_data, vote_counts, genre_index, limit=None):
+    """Movie ids in warming priority order, without duplicates"""
+    ids = movies_data['id'].to_numpy()
+    votes = np.asarray(vote_counts, dtype=np.float64)
+    ratings = movies_data['vote_average'].reset_index(drop=True)
+
+    rows = ratings[votes >= 1000].nlargest(TOP_MOVIES).index.tolist()
+    by_votes = np.argsort(-np.nan_to_num(votes), kind='stable')
+    rows += by_votes[:MOST_VOTED].tolist()
+    for genre in sorted(genre_index.all_ranks):
+        rows += genre_index.query([genre], limit=GENRE_PAGE)[0].tolist()
+    rows += by_votes[MOST_VOTED:].tolist()
+
+    order = list(dict.fromkeys(int(ids[row]) for row in rows))
+    return order[:limit] if limit else order
+
+
+def try_lock(path):
+    """Hold an exclusive lock on path for the life of the process, or return None"""
+    handle = open(path, 'a')
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class PosterWarmer:
+    """Fetches posters for a list of movie ids with bounded concurrency and rate.
+
+    fetch(movie_id) resolves and caches one poster; is_cached(movie_id) tells
+    whether the cache already has a usable answer, in which case the movie is
+    skipped without an upstream request.
+    """
+
+    def __init__(self, fetch, is_cached, concurrency=4, rate=5.0):
+        self.fetch = fetch
+        self.is_cached = is_cached
+        self.concurrency = max(1, concurrency)
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.task = None
+        self.total = self.done = self.found = self.missed = self.skipped = self.errors = 0
+        self.started_at = self.finished_at = None
+        self._next_slot = 0.0
+
+    def progress(self):
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        fetched = self.found + self.missed + self.errors
+        return {
+            "running": self.started_at is not None and self.finished_at is None,
+            "total": self.total,
+            "done": self.done,
+            "found": self.found,
+            "missed": self.missed,
+            "errors": self.errors,
+            "already_cached": self.skipped,
+            "elapsed_seconds": round(elapsed, 1),
+            "fetches_per_second": round(fetched / elapsed, 2) if elapsed else 0.0,
+            "finished": self.finished_at is not None,
+        }
+
+    async def _throttle(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _worker(self, queue):
+        for movie_id in queue:
+            if self.is_cached(movie_id):
+                self.skipped += 1
+            else:
+                await self._throttle()
+                try:
+                    url = await self.fetch(movie_id)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Poster warm-up failed for movie {movie_id}: {e}")
+                else:
+                    if url:
+                        self.found += 1
+                    else:
+                        self.missed += 1
+            self.done += 1
+
+    async def run(self, movie_ids):
+        """Warm every movie in order; returns the final progress"""
+        self.total = len(movie_ids)
+        self.started_at = time.time()
+        queue = iter(movie_ids)  # Shared by the workers, so each id is taken once
+        await asyncio.gather(*[self._worker(queue) for _ in range(self.concurrency)])
+        self.finished_at = time.time()
+        return self.progress()
+
+    def start(self, movie_ids):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(movie_ids))
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+async def warm_offline(limit, concurrency, rate):
+    import main
+
+    main.POSTER_WARM = False  # Run it here, in the foreground, instead
+    await main.startup_event()
+    try:
+        warmer = PosterWarmer(main.fetch_poster_url, lambda movie_id: main.poster_store.get(movie_id) is not None,
+                              concurrency=concurrency, rate=rate)
+        warmer.start(main.poster_warm_order(limit))
+        while not (await asyncio.wait({warmer.task}, timeout=5))[0]:
+            p = warmer.progress()
+            print(f"Warmed {p['done']}/{p['total']}: {p['found']} found, {p['missed']} missed, "
+                  f"{p['already_cached']} already cached")
+        print(warmer.task.result())
+    finally:
+        await main.shutdown_event()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-fill the poster cache")
+    parser.add_argument("--limit", type=int, default=None, help="movies to warm (default: all)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("POSTER_WARM_CONCURRENCY", "4")))
+    parser.add_argument("--rate", type=float, default=float(os.getenv("POSTER_WARM_RATE", "5")),
+                        help="upstream fetches per second")
+    args = parser.parse_args()
+    asyncio.run(warm_offline(args.limit, args.concurrency, args.rate))
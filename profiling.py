@@ -0,0 +1,226 @@
+"""On-demand request profiling and slow-request stack capture.
+
+Two ways a report ends up in the ProfileBuffer, readable via /admin/profiles:
+
+- Opt-in: a request with `X-Profile: 1` (or `?profile=1`) and a valid
+  X-Admin-Token runs under cProfile; the response carries the report id in
+  `X-Profile-Id`. One request is profiled at a time per worker.
+- Slow requests (off unless SLOW_REQUEST_MS is set): a sampled share of
+  requests is watched by a thread that records the event loop's stack every
+  few milliseconds. Requests slower than the threshold keep their stacks,
+  collapsed into counts per call path. The thread only samples while a
+  watched request is in flight, stores (code, line) pairs that are turned
+  into text only for a report, and drops its samples once nothing is
+  watched any more.
+
+Both observe the event loop thread, so the report shows whatever the loop
+ran while the request was in flight, including other requests' work that
+held it up. Work moved to threads (asyncio.to_thread, compute_pool) is not
+included.
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+PROFILE_TOP = 40  # Functions listed per cProfile report
+STACK_DEPTH = 30  # Innermost frames kept per sampled stack
+STACK_TOP = 25  # Call paths listed per slow-request report
+STACK_HISTORY_SECONDS = 30  # Samples kept; a longer request's report covers only its last 30 s
+
+
+def profile_report(profiler, top=PROFILE_TOP):
+    """cProfile stats as text, sorted by cumulative time"""
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats('cumulative').print_stats(top)
+    return out.getvalue()
+
+
+class ProfileBuffer:
+    """The most recent reports, oldest dropped first"""
+
+    def __init__(self, size=50):
+        self.reports = deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def add(self, kind, path, seconds, report, **extra):
+        entry = {
+            "id": f"{os.getpid()}-{next(self._ids)}",  # Reports live in one worker; the pid says which
+            "kind": kind,
+            "path": path,
+            "duration_ms": round(seconds * 1000, 1),
+            "timestamp": time.time(),
+            **extra,
+            "report": report,
+        }
+        self.reports.append(entry)
+        return entry["id"]
+
+    def list(self):
+        return [{k: v for k, v in entry.items() if k != "report"} for entry in reversed(self.reports)]
+
+    def get(self, report_id):
+        for entry in self.reports:
+            if entry["id"] == report_id:
+                return entry
+        return None
+
+
+def _frame_label(frame):
+    code, lineno = frame
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{lineno}"
+
+
+class StackSampler:
+    """Samples one thread's stack while any watched request is in flight"""
+
+    def __init__(self, interval=0.005, history_seconds=STACK_HISTORY_SECONDS):
+        self.interval = interval
+        self.samples = deque(maxlen=max(1, int(history_seconds / interval)))  # (perf_counter time, stack)
+        self.stacks = {}  # Interned stacks, so repeated samples share one tuple; emptied with samples
+        self.watching = 0
+        self.thread_id = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id=None):
+        self.thread_id = thread_id or threading.get_ident()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self.watching:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < STACK_DEPTH:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+            self.samples.append((time.perf_counter(), self.stacks.setdefault(stack, stack)))
+            time.sleep(self.interval)
+
+    def begin(self):
+        self.watching += 1
+        self._wake.set()
+        return time.perf_counter()
+
+    def end(self):
+        self.watching -= 1
+        if not self.watching:
+            self.samples.clear()
+            self.stacks = {}
+
+    def stacks_since(self, started):
+        """Collapsed stacks ("outer;...;inner" -> count) sampled since started"""
+        counts = {}
+        for at, stack in reversed(list(self.samples)):  # Copy: the sampler thread keeps appending
+            if at < started:
+                break
+            counts[stack] = counts.get(stack, 0) + 1
+        return {';'.join(_frame_label(frame) for frame in stack): n for stack, n in counts.items()}
+
+
+def stack_report(counts, interval, top=STACK_TOP):
+    lines = [f"{sum(counts.values())} samples every {interval * 1000:g} ms; most frequent call paths:"]
+    for stack, n in sorted(counts.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"{n:>6}  {stack}")
+    return '\n'.join(lines)
+
+
+class RequestProfiler:
+    """ASGI middleware for opt-in cProfile runs and slow-request capture.
+
+    admin_token() returns the token opt-in profiling requires ("" disables
+    it). slow_seconds <= 0 or sample_rate <= 0 disables slow capture.
+    """
+
+    def __init__(self, app, buffer, sampler, admin_token, slow_seconds=0.5, sample_rate=0.1):
+        self.app = app
+        self.buffer = buffer
+        self.sampler = sampler
+        self.admin_token = admin_token
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.busy = False
+
+    def _wants_profile(self, scope):
+        headers = dict(scope['headers'])
+        flag = headers.get(b'x-profile', b'').decode() or \
+            parse_qs(scope.get('query_string', b'').decode()).get('profile', [''])[0]
+        if flag not in ('1', 'true'):
+            return False
+        token = self.admin_token()
+        return bool(token) and secrets.compare_digest(headers.get(b'x-admin-token', b'').decode(), token)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        if self._wants_profile(scope):
+            await self._profiled(scope, receive, send)
+            return
+        if self.slow_seconds <= 0 or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        if self.sampler.thread_id is None:
+            self.sampler.start()
+        started = self.sampler.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            seconds = time.perf_counter() - started
+            if seconds >= self.slow_seconds:
+                report = stack_report(self.sampler.stacks_since(started), self.sampler.interval)
+                self.buffer.add("slow", scope['path'], seconds, report,
+                                query=scope.get('query_string', b'').decode())
+            self.sampler.end()  # After the report: the last watched request clears the samples
+
+    async def _profiled(self, scope, receive, send):
+        if self.busy:
+            await self.app(scope, receive, _with_header(send, b'x-profile', b'busy'))
+            return
+        profiler = cProfile.Profile()
+        stored = []
+
+        # The report is stored when the response starts, so its id can go in a header
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start' and not stored:
+                profiler.disable()
+                stored.append(self.buffer.add("profile", scope['path'], time.perf_counter() - started,
+                                              profile_report(profiler),
+                                              query=scope.get('query_string', b'').decode()))
+                message = dict(message, headers=list(message.get('headers', [])) +
+                               [(b'x-profile-id', stored[0].encode())])
+            await send(message)
+
+        self.busy = True
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if not stored:
+                profiler.disable()
+            self.busy = False
+
+
+def _with_header(send, name, value):
+    async def wrapped(message):
+        if message['type'] == 'http.response.start':
+            message = dict(message, headers=list(message.get('headers', [])) + [(name, value)])
+        await send(message)
+    return wrapped
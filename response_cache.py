@@ -0,0 +1,61 @@
+"""Pre-serialized responses for endpoints whose output only depends on the catalog"""
+import hashlib
+from collections import OrderedDict
+
+from fastapi.responses import Response
+
+
+class ResponseCache:
+    """Caches response bodies keyed by endpoint and parameters.
+
+    Every entry belongs to a generation, e.g. (dataset_version,
+    poster_cache_version). When the generation passed to get()/put() changes,
+    all entries are dropped. ETags combine the dataset version with a hash of
+    the body, so every worker hands out the same ETag for the same bytes.
+    Within a generation the least recently used entries are evicted once
+    there are more than max_entries or their bodies exceed max_bytes.
+    """
+
+    def __init__(self, max_age=300, max_entries=1000, max_bytes=16 * 1024 * 1024):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = None
+        self.entries = OrderedDict()  # key -> (etag, body, extra headers), least recently used first
+        self.bytes = 0  # Total body size of the entries
+
+    def _check_generation(self, generation):
+        if generation != self.generation:
+            self.entries = OrderedDict()
+            self.bytes = 0
+            self.generation = generation
+
+    def get(self, key, generation):
+        self._check_generation(generation)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, body, generation, dataset_version, headers=None):
+        self._check_generation(generation)
+        etag = f'"{dataset_version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+        entry = (etag, body, headers or {})
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= len(previous[1])
+        self.entries[key] = entry
+        self.bytes += len(body)
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, evicted, _) = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+        return entry
+
+    def respond(self, entry, if_none_match=None):
+        """Build a 200 with the cached body, or a 304 if the client already has it"""
+        etag, body, extra_headers = entry
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={self.max_age}", **extra_headers}
+        if if_none_match and (if_none_match.strip() == "*" or etag in
+                              [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,116 @@
+"""Free-text search over movie titles, overviews, genres, keywords, cast and director.
+
+An inverted index in CSC form: for every term (sorted), a slice of
+`docs` (row positions, ascending) and `tfs` (term counts). BM25 weights
+are computed once per posting when the index is built or loaded, so a
+query only touches the postings of its own terms: their weights are
+scaled by idf, summed per movie and the top results taken with a heap.
+"""
+import heapq
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+
+K1 = 1.2
+B = 0.75
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+def build_analyzer():
+    """Lowercases, splits into words and drops English stop words, for documents and queries alike"""
+    return CountVectorizer(token_pattern=TOKEN_PATTERN, stop_words='english').build_analyzer()
+
+
+class SearchIndex:
+    def __init__(self, terms, offsets, docs, tfs, doc_lengths):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.analyzer = build_analyzer()
+
+        n = len(doc_lengths)
+        avg_length = float(np.mean(doc_lengths)) if n else 0.0
+        df = np.diff(np.asarray(offsets))
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Document half of BM25 per posting; a query multiplies it by the term's idf
+        tf = np.asarray(tfs, dtype=np.float32)
+        norm = K1 * (1 - B + B * np.asarray(doc_lengths, dtype=np.float32)[np.asarray(docs)] / (avg_length or 1.0))
+        self.weights = tf * (K1 + 1) / (tf + norm)
+
+    @classmethod
+    def from_matrix(cls, terms, matrix, doc_lengths):
+        """Index a (documents x terms) count matrix"""
+        matrix = sp.csc_matrix(matrix)
+        matrix.sort_indices()
+        return cls(list(terms), matrix.indptr.astype(np.int64), matrix.indices.astype(np.int32),
+                   matrix.data.astype(np.uint16), np.asarray(doc_lengths, dtype=np.int32))
+
+    @classmethod
+    def build(cls, texts):
+        cv = CountVectorizer(analyzer=build_analyzer())
+        matrix = cv.fit_transform(texts)
+        return cls.from_matrix(cv.get_feature_names_out(), matrix, np.asarray(matrix.sum(axis=1)).ravel())
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query, limit=20, offset=0):
+        """(rows ranked by BM25, number of matching movies) for a free-text query"""
+        term_ids = {self.term_ids[t] for t in self.analyzer(query) if t in self.term_ids}
+        if not term_ids:
+            return [], 0
+        docs, scores = [], []
+        for t in term_ids:
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs.append(self.docs[start:end])
+            scores.append(self.weights[start:end] * self.idf[t])
+        docs = np.concatenate(docs)
+        scores = np.concatenate(scores)
+        if len(term_ids) > 1:
+            # Sum the contributions of every term per movie
+            order = np.argsort(docs, kind='stable')
+            docs, scores = docs[order], scores[order]
+            starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+            docs, scores = docs[starts], np.add.reduceat(scores, starts)
+        # Ties go to the lower row, like the other ranked lists
+        top = heapq.nlargest(offset + limit, zip(scores.tolist(), (-docs).tolist()))
+        return [-neg_row for _, neg_row in top[offset:]], len(docs)
+
+    def with_documents(self, rows, texts, n_docs):
+        """A new index with the given rows (re)indexed from texts and n_docs rows in all"""
+        rows = np.asarray(rows, dtype=np.int64)
+        # Counted with the analyzer directly: a vectorizer refuses texts that are all stop words
+        counts = [Counter(self.analyzer(text)) for text in texts]
+        new_terms = sorted(set().union(*counts))
+        new_col = {term: i for i, term in enumerate(new_terms)}
+        new = sp.coo_matrix((
+            np.array([tf for c in counts for tf in c.values()], dtype=np.int64),
+            (np.repeat(np.arange(len(counts)), [len(c) for c in counts]),
+             np.array([new_col[t] for c in counts for t in c], dtype=np.int64)),
+        ), shape=(len(counts), len(new_terms)))
+
+        terms = sorted(set(self.terms).union(new_terms))
+        lookup = {term: i for i, term in enumerate(terms)}
+        old_term_ids = np.array([lookup[t] for t in self.terms], dtype=np.int64)
+        new_term_ids = np.array([lookup[t] for t in new_terms], dtype=np.int64)
+
+        posting_terms = np.repeat(np.arange(len(self.terms)), np.diff(np.asarray(self.offsets)))
+        keep = ~np.isin(self.docs, rows)
+        matrix = sp.coo_matrix((
+            np.concatenate([np.asarray(self.tfs)[keep], new.data]),
+            (np.concatenate([np.asarray(self.docs)[keep], rows[new.row]]),
+             np.concatenate([old_term_ids[posting_terms[keep]], new_term_ids[new.col]])),
+        ), shape=(n_docs, len(terms)))
+        doc_lengths = np.zeros(n_docs, dtype=np.int32)
+        doc_lengths[:len(self.doc_lengths)] = self.doc_lengths
+        doc_lengths[rows] = [sum(c.values()) for c in counts]
+        return SearchIndex.from_matrix(terms, matrix, doc_lengths)
+
+    def to_arrays(self):
+        return {"terms": self.terms, "offsets": self.offsets, "docs": self.docs, "tfs": self.tfs,
+                "doc_lengths": self.doc_lengths}
@@ -15,6 +15,43 @@ const formatMoney = (n) => {
   return `$${n}`;
 };
 
+/* ─────────────────── Poster fill-in ─────────────────── */
+// Posters the API could not fetch in time come back as "" while the fetch
+// continues on the server; ask POST /posters for them until they arrive.
+const POSTER_POLL_MS = 1500;
+const POSTER_POLL_ROUNDS = 6;
+const usePosterFill = (movies, updateMovies) => {
+  const key = movies.map((m) => m.id).join(',');
+  useEffect(() => {
+    let cancelled = false;
+    let ids = movies.filter((m) => !m.poster_url).map((m) => m.id).slice(0, 100);
+    const poll = async () => {
+      for (let round = 0; ids.length > 0 && round < POSTER_POLL_ROUNDS; round++) {
+        await new Promise((r) => setTimeout(r, POSTER_POLL_MS));
+        if (cancelled) return;
+        try {
+          const res = await fetch(`${API_BASE}/posters`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ids }),
+          });
+          if (!res.ok || cancelled) return;
+          const data = await res.json();
+          if (cancelled) return;
+          const found = Object.fromEntries(Object.entries(data.posters || {}).filter(([, url]) => url));
+          if (Object.keys(found).length > 0) {
+            updateMovies((list) => list.map((m) => (!m.poster_url && found[m.id] ? { ...m, poster_url: found[m.id] } : m)));
+          }
+          const pending = new Set(data.pending || []);
+          ids = ids.filter((id) => pending.has(id));
+        } catch { return; }
+      }
+    };
+    poll();
+    return () => { cancelled = true; };
+  }, [key]);
+};
+
 /* ─────────────────── Star Rating ─────────────────── */
 const StarRating = ({ rating, count }) => (
   <div className="flex items-center gap-1.5">
@@ -31,6 +68,7 @@ const MovieDetailModal = ({ movieId, onClose }) => {
   const [detail, setDetail] = useState(null);
   const [loading, setLoading] = useState(true);
   const backdropRef = useRef(null);
+  usePosterFill(detail ? [detail] : [], (update) => setDetail((d) => (d ? update([d])[0] : d)));
 
   useEffect(() => {
     document.body.style.overflow = 'hidden';
@@ -439,6 +477,9 @@ const MovieSearch = forwardRef(({ activeSection = 'home', onSectionChange }, ref
   const [genreLoading, setGenreLoading]     = useState(false);
   const suggestionsRef = useRef(null);
   const inputRef       = useRef(null);
+  usePosterFill(recommendations, setRecommendations);
+  usePosterFill(topMovies, setTopMovies);
+  usePosterFill(genreMovies, setGenreMovies);
 
   /* ── Expose methods to parent via ref ── */
   useImperativeHandle(ref, () => ({
@@ -0,0 +1,194 @@
+"""Title resolution index for /recommend, built once at load time"""
+import re
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+FUZZY_THRESHOLD = 70  # Minimum token_sort_ratio for a fuzzy match
+FUZZY_SHORTLIST = 64  # Titles sharing the most trigrams that get fuzzy-scored
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_title(title):
+    """Collapse spacing and punctuation so "SpiderMan" matches "Spider-Man" """
+    return title.lower().replace(" ", "").replace("-", "").replace(":", "").replace("'", "")
+
+
+def title_trigrams(text):
+    """Word-boundary padded trigrams of each token, independent of word order"""
+    grams = set()
+    for token in _TOKEN_RE.findall(text.lower()):
+        padded = f"${token}$"
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def substring_trigrams(text):
+    """Trigrams any title containing text as a substring must also have"""
+    return {g for g in title_trigrams(text) if not g.startswith('$') and not g.endswith('$')}
+
+
+class TitleIndex:
+    """Resolves a user-typed title to a row position in movies_data.
+
+    Lookups run in the same order the endpoint always used: exact
+    case-insensitive title, normalized title, fuzzy token_sort_ratio and
+    finally substring. Fuzzy and substring matching only look at titles
+    pulled from a trigram inverted index instead of the whole catalog.
+    """
+
+    def __init__(self, titles, grams=None, offsets=None, postings=None):
+        self.titles = list(titles)
+        self.lower = [t.lower() for t in self.titles]
+        self.exact = {}
+        self.normalized = {}
+        for row, title in enumerate(self.titles):
+            self.exact.setdefault(title.lower(), row)
+            self.normalized.setdefault(normalize_title(title), row)
+
+        if grams is None:
+            grams, offsets, postings = self._build_postings()
+        self.gram_rows = {
+            gram: postings[offsets[i]:offsets[i + 1]] for i, gram in enumerate(grams)
+        }
+        self._grams, self._offsets, self._postings = grams, offsets, postings
+
+    def _build_postings(self):
+        rows_by_gram = {}
+        for row, title in enumerate(self.titles):
+            for gram in title_trigrams(title):
+                rows_by_gram.setdefault(gram, []).append(row)
+        grams = sorted(rows_by_gram)
+        offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum([len(rows_by_gram[g]) for g in grams], out=offsets[1:])
+        postings = np.array([row for g in grams for row in rows_by_gram[g]], dtype=np.int32)
+        return grams, offsets, postings
+
+    def to_arrays(self):
+        """Trigram postings in CSR form, for the model artifact"""
+        if self._grams is None:
+            grams = sorted(self.gram_rows)
+            offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+            np.cumsum([len(self.gram_rows[g]) for g in grams], out=offsets[1:])
+            postings = (np.concatenate([self.gram_rows[g] for g in grams]).astype(np.int32)
+                        if grams else np.empty(0, dtype=np.int32))
+            self._grams, self._offsets, self._postings = grams, offsets, postings
+        return {"grams": self._grams, "offsets": self._offsets, "postings": self._postings}
+
+    def copy(self):
+        """Independent copy that set_title() can change without affecting this one"""
+        clone = object.__new__(TitleIndex)
+        clone.__dict__.update(self.__dict__)
+        clone.titles, clone.lower = list(self.titles), list(self.lower)
+        clone.exact, clone.normalized = dict(self.exact), dict(self.normalized)
+        clone.gram_rows = dict(self.gram_rows)
+        return clone
+
+    def set_title(self, row, title):
+        """Change the title of a row, or append a row when row == len(self)"""
+        old = self.titles[row] if row < len(self.titles) else None
+        if old is None:
+            self.titles.append(title)
+            self.lower.append(title.lower())
+        else:
+            self.titles[row] = title
+            self.lower[row] = title.lower()
+
+        for lookup, key_of in ((self.exact, str.lower), (self.normalized, normalize_title)):
+            if old is not None and lookup.get(key_of(old)) == row:
+                # Hand the old key to the next row that still has it
+                old_key = key_of(old)
+                successor = next((r for r, t in enumerate(self.titles) if key_of(t) == old_key), None)
+                if successor is None:
+                    del lookup[old_key]
+                else:
+                    lookup[old_key] = successor
+            key = key_of(title)
+            if lookup.get(key, row + 1) > row:
+                lookup[key] = row
+
+        old_grams = title_trigrams(old) if old is not None else set()
+        new_grams = title_trigrams(title)
+        empty = np.empty(0, dtype=np.int32)
+        for gram in old_grams - new_grams:
+            rows = self.gram_rows[gram]
+            rows = rows[rows != row]
+            if len(rows):
+                self.gram_rows[gram] = rows
+            else:
+                del self.gram_rows[gram]
+        for gram in new_grams - old_grams:
+            rows = self.gram_rows.get(gram, empty)
+            self.gram_rows[gram] = np.insert(rows, np.searchsorted(rows, row), row).astype(np.int32)
+        self._grams = self._offsets = self._postings = None
+
+    def __len__(self):
+        return len(self.titles)
+
+    def candidates(self, query, limit=FUZZY_SHORTLIST):
+        """Rows sharing the most trigrams with the query, best first"""
+        lists = [self.gram_rows[g] for g in title_trigrams(query) if g in self.gram_rows]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.titles))
+        hits = np.flatnonzero(counts)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-counts[hits], limit - 1)[:limit]]
+        return hits[np.lexsort((hits, -counts[hits]))]
+
+    def fuzzy_match(self, query):
+        best_row, best_score = None, -1
+        for row in self.candidates(query).tolist():
+            score = fuzz.token_sort_ratio(query, self.titles[row])
+            if score > best_score or (score == best_score and row < best_row):
+                best_row, best_score = row, score
+        if best_row is None or best_score < FUZZY_THRESHOLD:
+            return None
+        # Same title may appear twice in the catalog; use the first occurrence
+        return self.exact[self.lower[best_row]]
+
+    def substring_match(self, query):
+        query_lower = query.lower()
+        grams = list(substring_trigrams(query))
+        if grams and all(g in self.gram_rows for g in grams):
+            rows = self.gram_rows[grams[0]]
+            for g in grams[1:]:
+                rows = np.intersect1d(rows, self.gram_rows[g], assume_unique=True)
+            rows = rows.tolist()
+        elif grams:
+            return None
+        else:
+            rows = range(len(self.lower))  # Query too short for trigrams
+        for row in rows:
+            if query_lower in self.lower[row]:
+                return row
+        return None
+
+    def resolve_exact(self, query):
+        """Return (row, match_type) for an exact or normalized title match, or (None, None).
+
+        Only dictionary lookups, cheap enough to run on the event loop.
+        """
+        query = query.strip()
+        row = self.exact.get(query.lower())
+        if row is not None:
+            return row, "exact"
+        row = self.normalized.get(normalize_title(query))
+        if row is not None:
+            return row, "normalized"
+        return None, None
+
+    def resolve(self, query):
+        """Return (row, match_type) for a title query, or (None, None)"""
+        row, match = self.resolve_exact(query)
+        if row is not None:
+            return row, match
+        query = query.strip()
+        row = self.fuzzy_match(query)
+        if row is not None:
+            return row, "fuzzy"
+        row = self.substring_match(query)
+        if row is not None:
+            return row, "substring"
+        return None, None
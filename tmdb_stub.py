@@ -0,0 +1,101 @@
+"""Local stand-in for TMDB, so benchmarks and load tests run offline.
+
+Serves the two upstream calls fetch_poster_upstream makes: the JSON API
+(GET /3/movie/{id}) and the movie web page it scrapes (GET /movie/{id}).
+Latency, error rate and the share of movies without a poster are
+configurable. Poster paths are derived from the movie id, so every run sees
+the same answers. Point the API at it with:
+
+    python tmdb_stub.py --port 8901 --latency-ms 80 --error-rate 0.02
+    TMDB_API_BASE=http://127.0.0.1:8901/3 TMDB_WEB_BASE=http://127.0.0.1:8901 uvicorn main:app
+
+GET /stats returns request counts, and POST /stats/reset clears them.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import HTMLResponse
+
+LATENCY_MS = float(os.getenv("TMDB_STUB_LATENCY_MS", "50"))  # Mean added delay per request
+JITTER_MS = float(os.getenv("TMDB_STUB_JITTER_MS", "20"))  # Delay is uniform in mean +/- jitter
+ERROR_RATE = float(os.getenv("TMDB_STUB_ERROR_RATE", "0"))  # Share of requests answered with a 500
+MISS_RATE = float(os.getenv("TMDB_STUB_MISS_RATE", "0.05"))  # Share of movies that have no poster
+
+app = FastAPI()
+stats = {"api": 0, "page": 0, "errors": 0, "misses": 0}
+rng = random.Random(0)
+
+
+def poster_path(movie_id):
+    """Stable poster path for a movie, or "" for the MISS_RATE share without one"""
+    digest = hashlib.sha1(str(movie_id).encode()).hexdigest()
+    if int(digest[:8], 16) / 0xFFFFFFFF < MISS_RATE:
+        return ""
+    return f"/{digest[:27]}.jpg"
+
+
+async def upstream_delay():
+    """Sleep like a TMDB round trip; raise a 500 for the ERROR_RATE share of calls"""
+    delay = max(0.0, LATENCY_MS + rng.uniform(-JITTER_MS, JITTER_MS)) / 1000
+    if delay:
+        await asyncio.sleep(delay)
+    if rng.random() < ERROR_RATE:
+        stats["errors"] += 1
+        raise HTTPException(status_code=500, detail="Stub upstream error")
+
+
+@app.get("/3/movie/{movie_id}")
+async def api_movie(movie_id: int, api_key: str = Query("")):
+    stats["api"] += 1
+    await upstream_delay()
+    path = poster_path(movie_id)
+    if not path:
+        stats["misses"] += 1
+    return {"id": movie_id, "poster_path": path or None}
+
+
+@app.get("/movie/{movie_id}", response_class=HTMLResponse)
+async def movie_page(movie_id: int):
+    stats["page"] += 1
+    await upstream_delay()
+    path = poster_path(movie_id)
+    if not path:
+        stats["misses"] += 1
+        return f"<html><body><h2>Movie {movie_id}</h2></body></html>"
+    # Same image markup the real page has, which the scraper's regex looks for
+    return (f'<html><body><div class="poster"><img class="poster" '
+            f'src="https://media.themoviedb.org/t/p/w300_and_h450_face{path}" '
+            f'alt="Movie {movie_id}"></div></body></html>')
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "latency_ms": LATENCY_MS, "jitter_ms": JITTER_MS,
+            "error_rate": ERROR_RATE, "miss_rate": MISS_RATE}
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    for key in stats:
+        stats[key] = 0
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local TMDB stand-in for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    parser.add_argument("--miss-rate", type=float, default=MISS_RATE)
+    args = parser.parse_args()
+    LATENCY_MS, JITTER_MS = args.latency_ms, args.jitter_ms
+    ERROR_RATE, MISS_RATE = args.error_rate, args.miss_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")